@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Search benchmark harness
+Replays benchmark_queries.json against each search path in its own subprocess and prints JSON
+
+    python benchmark_search.py                      # every target, 3 passes over the workload
+    python benchmark_search.py -t search_concept -r 10 -o before.json
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+TARGETS = ('search_concept', 'semantic_search', 'hybrid', 'chabad_text_search')
+MAX_RESULTS = 15
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _search_service(data_dir: Path):
+    from server import ChabadSearchService
+    return ChabadSearchService(str(data_dir / 'sichos.json'), str(data_dir / 'maamarim.json'))
+
+
+def _semantic_engine(service):
+    from embedding_providers import HashingEmbeddingProvider
+    from server import SemanticSearchEngine
+
+    engine = SemanticSearchEngine(HashingEmbeddingProvider())
+    # Never touch the real embeddings cache
+    engine.embeddings_file = os.path.join(tempfile.mkdtemp(prefix='bench-'), 'embeddings.pkl')
+    engine.create_embeddings(service.get_all_chunks(), service.near_duplicates.cluster_of)
+    return engine
+
+
+def setup_target(target: str, data_dir: Path) -> Callable[[str], int]:
+    """Build the target once and return a function that runs one query and counts results"""
+    if target == 'search_concept':
+        service = _search_service(data_dir)
+        return lambda query: len(service.search_concept(query, '', MAX_RESULTS))
+
+    if target == 'semantic_search':
+        engine = _semantic_engine(_search_service(data_dir))
+        return lambda query: len(engine.semantic_search(query, MAX_RESULTS, min_score=0.0))
+
+    if target == 'hybrid':
+        from hybrid_ranker import HybridConfig, HybridRanker
+
+        service = _search_service(data_dir)
+        engine = _semantic_engine(service)
+        ranker = HybridRanker(HybridConfig.from_env())
+        return lambda query: len(ranker.search(
+            lambda: service.search_concept(query, '', MAX_RESULTS),
+            lambda: engine.semantic_search(query, MAX_RESULTS, min_score=0.0),
+            MAX_RESULTS,
+            service.near_duplicates.cluster_of  # collapse repeated passages, as the server does
+        ))
+
+    if target == 'chabad_text_search':
+        from chabad_text_search import ChabadTextSearch
+
+        searcher = ChabadTextSearch(str(data_dir))
+        return lambda query: len(searcher.search_all(query))
+
+    raise ValueError(f"Unknown target: {target}")
+
+
+def run_target(target: str, queries: List[Dict], data_dir: Path, repeat: int, warmup: int) -> Dict:
+    """Measure one target in this process"""
+    import logging
+    logging.disable(logging.WARNING)  # per-query INFO logging would dominate the timings
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        run_query = setup_target(target, data_dir)
+    setup_seconds = time.perf_counter() - start
+
+    texts = [q['query'] for q in queries]
+    with contextlib.redirect_stdout(sys.stderr):
+        for text in texts[:warmup]:
+            run_query(text)
+
+        latencies: List[float] = []
+        by_kind: Dict[str, List[float]] = {}
+        result_counts: List[int] = []
+        wall_start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                t0 = time.perf_counter()
+                result_counts.append(run_query(query['query']))
+                elapsed = (time.perf_counter() - t0) * 1000
+                latencies.append(elapsed)
+                by_kind.setdefault(query.get('kind', 'other'), []).append(elapsed)
+        wall_seconds = time.perf_counter() - wall_start
+
+    return {
+        'target': target,
+        'setup_seconds': round(setup_seconds, 3),
+        'queries': len(latencies),
+        'throughput_qps': round(len(latencies) / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': summarize(latencies),
+        'latency_ms_by_kind': {kind: summarize(values) for kind, values in sorted(by_kind.items())},
+        'mean_results': round(sum(result_counts) / len(result_counts), 2) if result_counts else 0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        'p50': round(percentile(ordered, 50), 3),
+        'p95': round(percentile(ordered, 95), 3),
+        'p99': round(percentile(ordered, 99), 3),
+        'mean': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        'max': round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def run_in_subprocess(target: str, args) -> Dict:
+    """Each target gets a fresh interpreter so peak RSS and warm caches are its own - result cache off"""
+    command = [sys.executable, __file__, '--run-target', target, '--queries', args.queries,
+               '--data-dir', args.data_dir, '--repeat', str(args.repeat), '--warmup', str(args.warmup)]
+    completed = subprocess.run(command, capture_output=True, text=True, env=dict(os.environ, EMBEDDING_PROVIDER='none', SEARCH_CACHE_SIZE='0'))
+    if completed.returncode != 0:
+        return {'target': target, 'error': (completed.stderr.strip().splitlines() or ['failed'])[-1]}
+    return json.loads(completed.stdout)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search paths against a recorded query workload")
+    parser.add_argument('-q', '--queries', default=str(Path(__file__).parent / 'benchmark_queries.json'),
+                        help="Query workload JSON")
+    parser.add_argument('-d', '--data-dir', default=str(Path(__file__).parent / 'data'),
+                        help="Corpus directory with sichos.json and maamarim.json")
+    parser.add_argument('-t', '--targets', nargs='+', choices=TARGETS, default=list(TARGETS),
+                        help="Search paths to measure")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Passes over the workload")
+    parser.add_argument('-w', '--warmup', type=int, default=3, help="Untimed queries before measuring")
+    parser.add_argument('-o', '--output', help="Also write the JSON report to this file")
+    parser.add_argument('--run-target', choices=TARGETS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = json.load(f)['queries']
+
+    if args.run_target:
+        # Child process - measure one target and report on stdout
+        print(json.dumps(run_target(args.run_target, queries, Path(args.data_dir), args.repeat, args.warmup)))
+        return
+
+    results = {}
+    for target in args.targets:
+        print(f"⏱️  {target}...", file=sys.stderr)
+        results[target] = run_in_subprocess(target, args)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'workload': {'file': os.path.basename(args.queries), 'queries': len(queries), 'repeat': args.repeat},
+        'targets': results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
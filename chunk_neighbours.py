@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Precomputed "more like this" neighbours for every chunk
+An offline job ranks each chunk's closest chunks by TF-IDF and by embedding; the server only looks them up
+
+    python chunk_neighbours.py                     # both kinds, top 10, into chunk_neighbours.json
+    python chunk_neighbours.py -n 20 --no-semantic -o /tmp/neighbours.json
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from text_index import clean_text, tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+KINDS = ('lexical', 'semantic')
+# (chunk ref, similarity) - best first
+Neighbours = List[Tuple[str, float]]
+
+
+def chunk_ref(file_path: str, chunk_id: Any) -> str:
+    """Stable public id of a chunk - sichos:42, maamarim:7"""
+    return f'{Path(file_path).stem}:{chunk_id}'
+
+
+def lexical_neighbours(texts: Dict[str, str], top_n: int = 10, max_terms: int = 64,
+                       cluster_of: Optional[Callable[[str], Any]] = None) -> Dict[str, Neighbours]:
+    """Cosine similarity of TF-IDF vectors, each cut to its max_terms heaviest terms"""
+    term_counts = {ref: Counter(tokenize(clean_text(text))) for ref, text in texts.items()}
+    doc_freq: Counter = Counter()
+    for counts in term_counts.values():
+        doc_freq.update(counts.keys())
+    total = len(term_counts)
+
+    vectors: Dict[str, Dict[str, float]] = {}
+    postings: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+    for ref, counts in term_counts.items():
+        # A term in one chunk only can't link it to another - it would just dilute the norm
+        weights = [(term, (1 + math.log(count)) * math.log(total / doc_freq[term]))
+                   for term, count in counts.items() if 1 < doc_freq[term] < total]
+        top = heapq.nlargest(max_terms, weights, key=lambda item: item[1])
+        norm = math.sqrt(sum(w * w for _, w in top)) or 1.0
+        vectors[ref] = {term: w / norm for term, w in top}
+        for term, w in vectors[ref].items():
+            postings[term].append((ref, w))
+
+    neighbours = {}
+    for ref, vector in vectors.items():
+        scores: Dict[str, float] = defaultdict(float)
+        for term, weight in vector.items():
+            for other, other_weight in postings[term]:
+                scores[other] += weight * other_weight
+        neighbours[ref] = _best(ref, scores.items(), top_n, cluster_of)
+    return neighbours
+
+
+def semantic_neighbours(refs: Sequence[str], embeddings: 'np.ndarray', top_n: int = 10,
+                        cluster_of: Optional[Callable[[str], Any]] = None,
+                        block_rows: int = 1024) -> Dict[str, Neighbours]:
+    """Cosine similarity of unit-normalized embedding rows, a block of rows at a time"""
+    import numpy as np
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    # Room for the chunk itself and a few near-duplicates that get filtered out
+    keep = min(len(refs), top_n * 2 + 1)
+    neighbours = {}
+    for start in range(0, len(refs), block_rows):
+        similarities = embeddings[start:start + block_rows] @ embeddings.T
+        top = np.argpartition(-similarities, keep - 1, axis=1)[:, :keep]
+        for row, columns in enumerate(top):
+            ref = refs[start + row]
+            neighbours[ref] = _best(ref, ((refs[c], float(similarities[row, c])) for c in columns),
+                                    top_n, cluster_of)
+    return neighbours
+
+
+def _best(ref: str, scored, top_n: int, cluster_of: Optional[Callable[[str], Any]]) -> Neighbours:
+    """Highest scores first, without the chunk itself or copies of it"""
+    own_cluster = cluster_of(ref) if cluster_of is not None else ref
+    ranked = sorted(((other, score) for other, score in scored if other != ref and score > 0),
+                    key=lambda item: (-item[1], item[0]))
+    if cluster_of is not None:
+        ranked = [(other, score) for other, score in ranked if cluster_of(other) != own_cluster]
+    return [(other, round(score, 4)) for other, score in ranked[:top_n]]
+
+
+class ChunkNeighbours:
+    """Neighbour table loaded from the job's output - every lookup is a dict access"""
+
+    def __init__(self, table: Dict[str, Dict[str, Neighbours]], chunks: Dict[str, Any],
+                 embedder: Optional[str] = None, top_n: Optional[int] = None):
+        self.table = table
+        self.chunks = chunks  # ref -> SearchResult
+        self.embedder = embedder
+        # Neighbours kept per chunk and kind - the most related() can return
+        self.top_n = top_n or max((len(n) for lists in table.values() for n in lists.values()), default=0)
+        # Bare chunk ids, for refs given without their collection - only unambiguous ones resolve
+        self._by_id: Dict[str, List[str]] = defaultdict(list)
+        for ref in chunks:
+            self._by_id[ref.rsplit(':', 1)[-1]].append(ref)
+
+    @classmethod
+    def load(cls, path: str, chunks: Dict[str, Any], version: str) -> Optional['ChunkNeighbours']:
+        """The table at path, or None if it is missing or was built from another corpus"""
+        if not Path(path).exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != FORMAT_VERSION or data.get('corpus_version') != version:
+            logger.warning(f"Neighbour table {path} was built from another corpus - rerun chunk_neighbours.py")
+            return None
+        table = {ref: {kind: [tuple(n) for n in lists.get(kind, ())] for kind in KINDS}
+                 for ref, lists in data['neighbours'].items()}
+        logger.info(f"Loaded neighbours for {len(table)} chunks (top {data.get('top_n')}, "
+                    f"embedder {data.get('embedder') or 'none'})")
+        return cls(table, chunks, data.get('embedder'), data.get('top_n'))
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """Canonical ref for sichos:42 or a bare 42; ValueError when a bare id is in several collections"""
+        if ref in self.chunks:
+            return ref
+        matches = self._by_id.get(ref, [])
+        if len(matches) > 1:
+            raise ValueError(f"Chunk id {ref} is ambiguous - use one of {', '.join(sorted(matches))}")
+        return matches[0] if matches else None
+
+    def related(self, ref: str, kind: str, limit: int = 10) -> List[Tuple[Any, float]]:
+        """(SearchResult, similarity) pairs of one kind, best first"""
+        return [(self.chunks[other], score) for other, score in self.table.get(ref, {}).get(kind, ())[:limit]
+                if other in self.chunks]
+
+
+def build(service, engine=None, top_n: int = 10) -> Dict[str, Any]:
+    """The neighbour table for every chunk of a ChabadSearchService, as written to disk"""
+    refs_by_key = {key: chunk_ref(*key) for key in service.chunks_by_key}
+    clusters = {refs_by_key[key]: service.near_duplicates.cluster_of(key) for key in refs_by_key}
+    texts = {refs_by_key[key]: f'{chunk.chunk_title}\n{chunk.text}' for key, chunk in service.chunks_by_key.items()}
+
+    start = time.perf_counter()
+    lexical = lexical_neighbours(texts, top_n, cluster_of=clusters.get)
+    logger.info(f"Lexical neighbours for {len(lexical)} chunks in {time.perf_counter() - start:.1f}s")
+
+    semantic: Dict[str, Neighbours] = {}
+    if engine is not None:
+        start = time.perf_counter()
+        refs = [chunk_ref(chunk.file_path, chunk.chunk_id) for chunk in engine.chunks_data]
+        semantic = semantic_neighbours(refs, engine.embeddings, top_n, cluster_of=clusters.get)
+        logger.info(f"Semantic neighbours for {len(semantic)} chunks in {time.perf_counter() - start:.1f}s")
+
+    return {
+        'format': FORMAT_VERSION,
+        'corpus_version': service.corpus_version,
+        'embedder': engine.provider.cache_slug if engine is not None else None,
+        'top_n': top_n,
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'neighbours': {ref: {'lexical': lexical.get(ref, []), 'semantic': semantic.get(ref, [])}
+                       for ref in texts},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute lexical and semantic neighbours for every chunk")
+    parser.add_argument('-s', '--sichos', default=os.environ.get('SICHOS_FILE', 'data/sichos.json'))
+    parser.add_argument('-m', '--maamarim', default=os.environ.get('MAAMARIM_FILE', 'data/maamarim.json'))
+    parser.add_argument('-n', '--top', type=int, default=10, help="Neighbours kept per chunk and kind")
+    parser.add_argument('-o', '--output', default=os.environ.get('CHUNK_NEIGHBOURS_FILE', 'chunk_neighbours.json'))
+    parser.add_argument('--no-semantic', action='store_true', help="Skip embeddings - lexical neighbours only")
+    args = parser.parse_args()
+
+    from server import ChabadSearchService, SemanticSearchEngine
+
+    os.environ.setdefault('SEARCH_CACHE_SIZE', '0')  # nothing is searched
+    service = ChabadSearchService(args.sichos, args.maamarim)
+
+    engine = None
+    if not args.no_semantic:
+        from embedding_providers import get_embedding_provider
+
+        # Same provider and embeddings cache as the server
+        provider = get_embedding_provider(os.environ.get('OPENAI_API_KEY', ''))
+        if provider is None:
+            logger.warning("No embedding provider configured - lexical neighbours only")
+        else:
+            engine = SemanticSearchEngine(provider)
+            if not engine.load_embeddings():
+                engine.create_embeddings(service.get_all_chunks(), service.near_duplicates.cluster_of)
+
+    table = build(service, engine, args.top)
+    tmp_path = f'{args.output}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(table, f, ensure_ascii=False)
+    os.replace(tmp_path, args.output)  # a running server never reads a half-written table
+    logger.info(f"✅ Wrote neighbours for {len(table['neighbours'])} chunks to {args.output}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
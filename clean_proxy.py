@@ -3,11 +3,11 @@
 Clean CORS proxy server for Claude API calls with embedded API key
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
 import json
 import os
+from llm_gateway import LLMGatewayError, get_gateway
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins
@@ -39,31 +39,20 @@ def proxy_claude():
         # Get API key from environment
         api_key = os.getenv('CLAUDE_API_KEY', 'your-api-key-here')
 
-        # Make request to Claude API
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': api_key,
-                'anthropic-version': '2023-06-01'
-            },
-            json={
-                'model': 'claude-sonnet-4-20250514',
-                'max_tokens': 4000,
-                'messages': [{'role': 'user', 'content': prompt}]
-            },
-            timeout=30
-        )
+        payload = {
+            'model': 'claude-sonnet-4-20250514',
+            'max_tokens': 4000,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
 
-        if response.status_code == 200:
-            result = response.json()
-            return jsonify(result)
-        else:
-            error_msg = f'Claude API error: {response.status_code}'
-            if response.text:
-                error_msg += f' - {response.text}'
-            return jsonify({'error': error_msg}), response.status_code
+        # Pooled, retrying client shared by all requests
+        if data.get('stream'):
+            chunks = get_gateway().stream_message(payload, api_key=api_key, timeout=30)
+            return Response(stream_with_context(chunks), mimetype='text/plain; charset=utf-8')
+        return jsonify(get_gateway().create_message(payload, api_key=api_key, timeout=30))
 
+    except LLMGatewayError as e:
+        return jsonify({'error': str(e)}), e.status_code or 502
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Shared search index over every sefer under CHABAD_DATA_PATH
+Replaces shelling out to ripgrep from the proxies
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from text_index import InvertedIndex, SearchHit
+
+logger = logging.getLogger(__name__)
+
+# Text files are indexed in blocks of roughly this many characters
+TEXT_BLOCK_CHARS = 2000
+
+
+def corpus_signature(root: str) -> Tuple:
+    """Cheap fingerprint of the tree - changes when any sefer is added, removed or modified"""
+    signature = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(('.json', '.txt')):
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue  # deleted or unreadable mid-walk - the next check sees the tree settled
+                signature.append((dirpath, filename, stat.st_size, stat.st_mtime))
+    return tuple(signature)
+
+
+class CorpusIndex:
+    """Inverted index over the chunks of all JSON books and text files in a directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.index = InvertedIndex()
+        self.signature = corpus_signature(root)
+        self._build()
+
+    def _build(self):
+        start = time.perf_counter()
+        files = 0
+        for dirpath, _, filenames in sorted(os.walk(self.root)):
+            for filename in sorted(filenames):
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root)
+                if filename.endswith('.json'):
+                    files += self._add_json(full_path, rel_path)
+                elif filename.endswith('.txt'):
+                    files += self._add_text(full_path, rel_path)
+        logger.info(f"Indexed {len(self.index)} chunks from {files} files in "
+                    f"{time.perf_counter() - start:.2f}s ({len(self.index.postings)} terms)")
+
+    def _add_json(self, full_path: str, rel_path: str) -> int:
+        try:
+            with open(full_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+            logger.warning(f"Skipping {rel_path}: {e}")
+            return 0
+        if not isinstance(data, dict) or not isinstance(data.get('chunks'), list):
+            return 0  # not a structured book
+
+        book = data.get('book_name_he', '') or data.get('book_name_en', '') or os.path.basename(rel_path)
+        for chunk in data['chunks']:
+            title = chunk.get('chunk_metadata', {}).get('chunk_title', '') or chunk.get('chunk_title', '')
+            self.index.add(rel_path, book, chunk.get('chunk_id'), title, chunk.get('text', ''))
+        return 1
+
+    def _add_text(self, full_path: str, rel_path: str) -> int:
+        book = os.path.splitext(os.path.basename(rel_path))[0]
+        block: List[str] = []
+        block_chars = 0
+        block_number = 0
+        try:
+            with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    block.append(line)
+                    block_chars += len(line)
+                    # Close blocks on paragraph breaks once they are big enough
+                    if (block_chars >= TEXT_BLOCK_CHARS and not line.strip()) or block_chars >= 2 * TEXT_BLOCK_CHARS:
+                        block_number += 1
+                        self.index.add(rel_path, book, block_number, f"{book} #{block_number}", ''.join(block))
+                        block, block_chars = [], 0
+        except OSError as e:
+            logger.warning(f"Skipping {rel_path}: {e}")
+            return 0
+        if block_chars:
+            block_number += 1
+            self.index.add(rel_path, book, block_number, f"{book} #{block_number}", ''.join(block))
+        return 1
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        return self.index.search(query, limit)
+
+
+def format_hits(hits: List[SearchHit], max_chars: int = 3000) -> str:
+    """Hits as plain text for an LLM prompt - book and title, then the snippet"""
+    blocks = []
+    used = 0
+    for hit in hits:
+        block = f"{hit.book} // {hit.title}\n{hit.snippet}"
+        if blocks and used + len(block) > max_chars:
+            break
+        blocks.append(block[:max_chars])
+        used += len(block) + 2
+    return '\n\n'.join(blocks)
+
+
+_indexes: Dict[str, CorpusIndex] = {}
+_last_checked: Dict[str, float] = {}
+_checking = set()  # roots with a background check in progress
+_indexes_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+
+
+def _recheck(root: str, corpus: CorpusIndex):
+    """Walk the tree off the request path; swap in a rebuilt index if anything changed"""
+    try:
+        if corpus_signature(root) != corpus.signature:
+            logger.info(f"Corpus under {root} changed - rebuilding index in the background")
+            rebuilt = CorpusIndex(root)
+            with _indexes_lock:
+                _indexes[root] = rebuilt
+    except Exception as e:
+        logger.error(f"Corpus index refresh for {root} failed, keeping the current index: {e}")
+    finally:
+        with _indexes_lock:
+            _checking.discard(root)
+
+
+def get_corpus_index(root: str, recheck_seconds: float = 60.0) -> Optional[CorpusIndex]:
+    """Process-wide index for root, rebuilt in the background when the files under it change"""
+    if not os.path.isdir(root):
+        return None
+
+    with _indexes_lock:
+        corpus = _indexes.get(root)
+        now = time.time()
+        if corpus is not None:
+            if now - _last_checked.get(root, 0) > recheck_seconds and root not in _checking:
+                # Searches keep using the current index until the new one is swapped in
+                _last_checked[root] = now
+                _checking.add(root)
+                threading.Thread(target=_recheck, args=(root, corpus), name='corpus-index-refresh',
+                                 daemon=True).start()
+            return corpus
+        build_lock = _build_locks.setdefault(root, threading.Lock())
+
+    # Only the very first search for a root waits for the build - once, not per caller
+    with build_lock:
+        with _indexes_lock:
+            corpus = _indexes.get(root)
+        if corpus is None:
+            corpus = CorpusIndex(root)
+            with _indexes_lock:
+                _indexes[root] = corpus
+                _last_checked[root] = time.time()
+        return corpus
@@ -4,11 +4,11 @@ Simple CORS proxy server for Claude API calls
 Allows the demo to work from local HTML files
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import requests
 import json
 import os
+from llm_gateway import LLMGatewayError, get_gateway
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins
@@ -26,26 +26,20 @@ def proxy_claude():
         # Get API key from environment variable
         api_key = os.getenv('CLAUDE_API_KEY', 'your-api-key-here')
 
-        # Make request to Claude API
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': api_key,
-                'anthropic-version': '2023-06-01'
-            },
-            json={
-                'model': 'claude-3-sonnet-20240229',
-                'max_tokens': 4000,
-                'messages': [{'role': 'user', 'content': prompt}]
-            }
-        )
-
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': f'Claude API error: {response.status_code}'}), response.status_code
+        payload = {
+            'model': 'claude-3-sonnet-20240229',
+            'max_tokens': 4000,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
 
+        # Pooled, retrying client shared by all requests
+        if data.get('stream'):
+            chunks = get_gateway().stream_message(payload, api_key=api_key)
+            return Response(stream_with_context(chunks), mimetype='text/plain; charset=utf-8')
+        return jsonify(get_gateway().create_message(payload, api_key=api_key))
+
+    except LLMGatewayError as e:
+        return jsonify({'error': str(e)}), e.status_code or 502
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Embedding providers for semantic search
+OpenAI (remote), sentence-transformers (local CPU) and a hashing stub behind one interface
+"""
+
+import hashlib
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy, openai and sentence_transformers (torch) are imported inside the
+# providers so that only the configured backend is ever loaded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+
+class EmbeddingProvider:
+    """Base class - subclasses turn texts into a 2D float32 array"""
+
+    name = 'base'
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def cache_slug(self) -> str:
+        """Filesystem-safe identifier used to key the embeddings cache"""
+        return re.sub(r'[^A-Za-z0-9]+', '_', f"{self.name}_{self.model_name}").strip('_')
+
+    def embed_documents(self, texts: List[str]) -> 'np.ndarray':
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> 'np.ndarray':
+        return self.embed_documents([text])[0]
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Remote embeddings through the OpenAI API"""
+
+    name = 'openai'
+
+    def __init__(self, api_key: str, model_name: str = 'text-embedding-3-large',
+                 batch_size: int = 100, batch_delay: float = 15.0):
+        from openai import OpenAI
+
+        super().__init__(model_name)
+        self.client = OpenAI(api_key=api_key)
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+
+    def embed_documents(self, texts: List[str]) -> 'np.ndarray':
+        import numpy as np
+
+        # Batch embed (OpenAI allows up to 2048 texts per request)
+        all_embeddings = []
+        total_batches = (len(texts) + self.batch_size - 1) // self.batch_size
+
+        for i in range(0, len(texts), self.batch_size):
+            batch = texts[i:i + self.batch_size]
+            if total_batches > 1:
+                logger.info(f"Embedding batch {i//self.batch_size + 1}/{total_batches}")
+
+            if i > 0:
+                time.sleep(self.batch_delay)  # Rate limit protection - wait between batches
+
+            response = self.client.embeddings.create(model=self.model_name, input=batch)
+            all_embeddings.extend(item.embedding for item in response.data)
+
+        return np.array(all_embeddings, dtype=np.float32)
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """Offline embeddings with a multilingual sentence-transformer on CPU"""
+
+    name = 'local'
+
+    def __init__(self, model_name: str = DEFAULT_LOCAL_MODEL, batch_size: int = 64,
+                 backend: str = 'torch', quantize: bool = False, workers: int = 2,
+                 onnx_file: str = 'onnx/model_quint8_avx2.onnx', query_cache_size: int = 1024):
+        from sentence_transformers import SentenceTransformer
+
+        super().__init__(model_name)
+        self.batch_size = batch_size
+        self.backend = backend
+        self.quantize = quantize
+
+        model_kwargs = {}
+        if backend == 'onnx' and quantize:
+            # sentence-transformers ships pre-quantized int8 ONNX exports for its models
+            model_kwargs['file_name'] = onnx_file
+
+        logger.info(f"Loading local embedding model {model_name} (backend={backend}, int8={quantize})...")
+        self.model = SentenceTransformer(model_name, device='cpu', backend=backend,
+                                         model_kwargs=model_kwargs or None)
+
+        if backend == 'torch' and quantize:
+            import torch
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='local-embed')
+        self._query_cache: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def cache_slug(self) -> str:
+        suffix = f"_{self.backend}" + ('_int8' if self.quantize else '')
+        return super().cache_slug + suffix
+
+    def _encode(self, texts: List[str]) -> 'np.ndarray':
+        import numpy as np
+
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=True, show_progress_bar=False).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> 'np.ndarray':
+        import numpy as np
+
+        # Fan the batches out over the pool; encode releases the GIL inside the model
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if not batches:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(list(self._pool.map(self._encode, batches)))
+
+    def embed_query(self, text: str) -> 'np.ndarray':
+        with self._lock:
+            cached = self._query_cache.get(text)
+            if cached is not None:
+                self._query_cache.move_to_end(text)
+                return cached
+
+        embedding = self._pool.submit(self._encode, [text]).result()[0]
+
+        with self._lock:
+            self._query_cache[text] = embedding
+            if len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic feature-hashing embeddings - no model, no network
+
+    Words and character trigrams are hashed into a fixed number of buckets. Quality is far
+    below a real model, but it exercises the whole vector path offline, for benchmarks and tests.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dimensions: int = 384):
+        super().__init__(f'blake2b-{dimensions}')
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r'\w+', text.lower())
+        trigrams = [word[i:i + 3] for word in words for i in range(max(1, len(word) - 2))]
+        return words + trigrams
+
+    def embed_documents(self, texts: List[str]) -> 'np.ndarray':
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0  # signed to keep collisions unbiased
+        return vectors
+
+
+def get_embedding_provider(openai_api_key: str = '') -> Optional[EmbeddingProvider]:
+    """Pick an embedding backend from EMBEDDING_PROVIDER (auto, openai, local, hashing, none)"""
+    choice = os.environ.get('EMBEDDING_PROVIDER', 'auto').lower()
+
+    if choice == 'none':
+        return None
+
+    if choice == 'hashing':
+        return HashingEmbeddingProvider()
+
+    if choice == 'local':
+        return LocalEmbeddingProvider(
+            model_name=os.environ.get('LOCAL_EMBEDDING_MODEL', DEFAULT_LOCAL_MODEL),
+            batch_size=int(os.environ.get('LOCAL_EMBEDDING_BATCH_SIZE', 64)),
+            backend=os.environ.get('LOCAL_EMBEDDING_BACKEND', 'torch'),
+            quantize=os.environ.get('LOCAL_EMBEDDING_INT8', '').lower() in ('1', 'true', 'yes'),
+            workers=int(os.environ.get('LOCAL_EMBEDDING_WORKERS', 2)),
+        )
+
+    if choice == 'openai' and not openai_api_key:
+        raise ValueError("EMBEDDING_PROVIDER=openai requires OPENAI_API_KEY")
+
+    # 'openai' or 'auto' - auto keeps the original behaviour of requiring a project key
+    if openai_api_key and (choice == 'openai' or openai_api_key.startswith('sk-proj-')):
+        return OpenAIEmbeddingProvider(openai_api_key)
+
+    return None
@@ -5,63 +5,41 @@ Enhanced CORS proxy server that searches Chabad dataset and uses Claude for anal
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import json
 import os
-import subprocess
-import glob
+from corpus_index import get_corpus_index, format_hits
+from llm_gateway import LLMGatewayError, get_gateway
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins
 
 # Chabad dataset path
-CHABAD_DATA_PATH = "/Users/elishapearl/Library/CloudStorage/Dropbox/chabad-uploads"
+CHABAD_DATA_PATH = os.getenv('CHABAD_DATA_PATH', "/Users/elishapearl/Library/CloudStorage/Dropbox/chabad-uploads")
 CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY', 'your-api-key-here')  # Set via environment variable
+SEARCH_HIT_LIMIT = int(os.getenv('SEARCH_HIT_LIMIT', 20))
 
 def search_chabad_files(query):
     """Search through Chabad files for the query term"""
     search_results = []
 
     try:
-        # Use ripgrep to search for the query in all JSON files
-        cmd = [
-            '/Users/elishapearl/.nvm/versions/node/v22.14.0/lib/node_modules/@anthropic-ai/claude-code/vendor/ripgrep/arm64-darwin/rg',
-            '-n', '-C', '2',  # line numbers and 2 lines context
-            '--type', 'json',
-            query,
-            CHABAD_DATA_PATH
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-
-        if result.returncode == 0 and result.stdout:
+        # Shared in-process index - built on first use, no subprocess per query
+        corpus = get_corpus_index(CHABAD_DATA_PATH)
+        if corpus is None:
             search_results.append({
-                'source': 'ripgrep_json',
-                'content': result.stdout[:3000]  # Limit content size for faster processing
+                'source': 'error',
+                'content': f'Dataset not found: {CHABAD_DATA_PATH}'
             })
+            return search_results
 
-        # Also search in text files
-        cmd_txt = [
-            '/Users/elishapearl/.nvm/versions/node/v22.14.0/lib/node_modules/@anthropic-ai/claude-code/vendor/ripgrep/arm64-darwin/rg',
-            '-n', '-C', '2',
-            '--type', 'txt',
-            query,
-            CHABAD_DATA_PATH
-        ]
-
-        result_txt = subprocess.run(cmd_txt, capture_output=True, text=True, timeout=30)
-
-        if result_txt.returncode == 0 and result_txt.stdout:
+        hits = corpus.search(query, limit=SEARCH_HIT_LIMIT)
+        if hits:
             search_results.append({
-                'source': 'ripgrep_txt',
-                'content': result_txt.stdout[:3000]  # Limit content size for faster processing
+                'source': 'corpus_index',
+                'content': format_hits(hits),  # Limit content size for faster processing
+                'hits': [hit.to_dict() for hit in hits]
             })
 
-    except subprocess.TimeoutExpired:
-        search_results.append({
-            'source': 'error',
-            'content': 'Search timeout - dataset is very large'
-        })
     except Exception as e:
         search_results.append({
             'source': 'error',
@@ -137,36 +115,23 @@ Focus on the actual content found in the search results above. Include proper so
 """
 
         # Step 3: Send to Claude for analysis
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': CLAUDE_API_KEY,
-                'anthropic-version': '2023-06-01'
-            },
-            json={
-                'model': 'claude-sonnet-4-20250514',
-                'max_tokens': 4000,
-                'messages': [{'role': 'user', 'content': prompt}]
-            },
-            timeout=120
-        )
-
-        if response.status_code == 200:
-            claude_result = response.json()
-            return jsonify({
-                'query': query,
-                'search_results_count': len([r for r in search_results if r.get('source') != 'error']),
-                'analysis': claude_result,
-                'raw_search_results': search_results  # For debugging
-            })
-        else:
-            error_msg = f'Claude API error: {response.status_code}'
-            if response.text:
-                error_msg += f' - {response.text}'
-            return jsonify({'error': error_msg}), response.status_code
+        claude_result = get_gateway().create_message({
+            'model': 'claude-sonnet-4-20250514',
+            'max_tokens': 4000,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }, api_key=CLAUDE_API_KEY, timeout=120)
+
+        return jsonify({
+            'query': query,
+            'search_results_count': len([r for r in search_results if r.get('source') != 'error']),
+            'analysis': claude_result,
+            'raw_search_results': search_results  # For debugging
+        })
 
     except Exception as e:
+        # Bad requests are reported as-is; only transient failures fall back to raw results
+        if isinstance(e, LLMGatewayError) and not e.retryable:
+            return jsonify({'error': str(e)}), e.status_code
         # If Claude times out but we found search results, show them
         if 'search_results' in locals() and search_results and any(r.get('source') != 'error' for r in search_results):
             return jsonify({
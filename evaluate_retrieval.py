@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality evaluation against golden query -> source lists
+Runs each configured pipeline and reports recall@k, MRR and nDCG next to latency
+
+    python evaluate_retrieval.py                                   # shipped golden sets, default pipelines
+    python evaluate_retrieval.py -g my_golden.json -p pipelines.json -k 5 10 -o eval.json
+
+Golden files are either a chabad_text_search.py export (a list of matches - one query per
+distinct match_text) or {"queries": [{"query": ..., "relevant": [{"file", "chunk_id", "grade", "text"}]}]}.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmark_search import peak_rss_mb, summarize
+
+ROOT = Path(__file__).parent
+# Judged against the bundled data/*.json - the chabad_text_search.py exports come from other books
+DEFAULT_GOLDEN = [str(ROOT / 'golden_queries.json')]
+
+# What the server runs with HYBRID_* unset (HybridConfig.from_env, semantic_search's default threshold),
+# plus the neighbours worth comparing them with
+DEFAULT_PIPELINES = [
+    {'name': 'keyword', 'kind': 'keyword'},
+    {'name': 'semantic@0.25', 'kind': 'semantic', 'min_score': 0.25},
+    {'name': 'semantic@0.35', 'kind': 'semantic', 'min_score': 0.35},
+    {'name': 'hybrid-rrf', 'kind': 'hybrid', 'method': 'rrf', 'min_score': 0.25},
+    {'name': 'hybrid-weighted-0.5', 'kind': 'hybrid', 'method': 'weighted', 'keyword_weight': 0.5,
+     'semantic_weight': 0.5, 'min_score': 0.25},
+]
+
+TAG_RE = re.compile(r'<[^>]+>')
+# Exports drop spaces around markup, so snippets are compared with all whitespace removed
+SPACES_RE = re.compile(r'\s+')
+SNIPPET_CHARS = 40
+
+
+def squash(text: str) -> str:
+    return SPACES_RE.sub('', TAG_RE.sub('', text or ''))
+
+
+@dataclass
+class GoldenSource:
+    """One judged source - matched by file name and chunk id, or by its text"""
+    file: str
+    chunk_id: Any
+    grade: int = 1
+    text: str = ''
+
+
+@dataclass
+class GoldenQuery:
+    query: str
+    sources: List[GoldenSource] = field(default_factory=list)
+    kind: str = ''  # phrase, concept, english, transliteration, misspelling - reported separately
+
+
+def load_golden(path: str) -> List[GoldenQuery]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        return [GoldenQuery(q['query'], [GoldenSource(s.get('file', ''), s.get('chunk_id'), int(s.get('grade', 1)),
+                                                      s.get('text', '')) for s in q.get('relevant', [])],
+                            q.get('kind', ''))
+                for q in data.get('queries', [])]
+
+    # chabad_text_search.py export - every match of a phrase is a relevant source for that phrase
+    queries: Dict[str, GoldenQuery] = {}
+    seen = set()
+    for match in data:
+        query = match.get('match_text', '').strip()
+        key = (query, os.path.basename(match.get('file_path', '')), match.get('chunk_id'))
+        if not query or key in seen:
+            continue  # several matches in one chunk are one source
+        seen.add(key)
+        snippet = squash(match.get('context_before', ''))[-SNIPPET_CHARS:] + squash(match.get('context_after', ''))[:SNIPPET_CHARS]
+        queries.setdefault(query, GoldenQuery(query)).sources.append(
+            GoldenSource(key[1], key[2], 1, snippet))
+    return list(queries.values())
+
+
+class Corpus:
+    """Maps golden sources onto the chunks the pipelines can actually return"""
+
+    def __init__(self, chunks: List[Any]):
+        self.by_file_chunk = {(os.path.basename(c.file_path), c.chunk_id): (c.file_path, c.chunk_id) for c in chunks}
+        self.squashed = [((c.file_path, c.chunk_id), squash(c.text)) for c in chunks]
+
+    def resolve(self, source: GoldenSource) -> Optional[Tuple[str, Any]]:
+        key = self.by_file_chunk.get((os.path.basename(source.file), source.chunk_id))
+        if key is not None:
+            return key
+        if source.text:
+            for chunk_key, text in self.squashed:
+                if source.text in text:
+                    return chunk_key
+        return None
+
+
+def recall_at_k(ranked: List[Tuple], relevant: Dict[Tuple, int], k: int) -> float:
+    return len([key for key in ranked[:k] if key in relevant]) / len(relevant)
+
+
+def reciprocal_rank(ranked: List[Tuple], relevant: Dict[Tuple, int]) -> float:
+    for rank, key in enumerate(ranked, 1):
+        if key in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked: List[Tuple], relevant: Dict[Tuple, int], k: int) -> float:
+    dcg = sum((2 ** relevant.get(key, 0) - 1) / math.log2(i + 2) for i, key in enumerate(ranked[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** grade - 1) / math.log2(i + 2) for i, grade in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def build_pipeline(config: Dict, service, engine_factory, max_results: int):
+    """A function query -> ranked list of (file_path, chunk_id)"""
+    kind = config['kind']
+    min_score = float(config.get('min_score', 0.25))
+
+    if kind == 'keyword':
+        return lambda q: [(r.file_path, r.chunk_id) for r in service.search_concept(q, '', max_results)]
+
+    engine = engine_factory()
+    if kind == 'semantic':
+        return lambda q: [(r.file_path, r.chunk_id) for r in engine.semantic_search(q, max_results, min_score)]
+
+    if kind == 'hybrid':
+        from hybrid_ranker import HybridConfig, HybridRanker
+
+        ranker = HybridRanker(HybridConfig(
+            method=config.get('method', 'rrf'),
+            keyword_weight=float(config.get('keyword_weight', 1.0)),
+            semantic_weight=float(config.get('semantic_weight', 1.0)),
+            rrf_k=int(config.get('rrf_k', 60)),
+            min_score=float(config.get('hybrid_min_score', 0.0)),
+        ))
+        return lambda q: [hit.key for hit in ranker.search(
+            lambda: service.search_concept(q, '', max_results),
+            lambda: engine.semantic_search(q, max_results, min_score),
+            max_results,
+            service.near_duplicates.cluster_of
+        )]
+
+    raise ValueError(f"Unknown pipeline kind: {kind}")
+
+
+def make_engine_factory(service):
+    """Semantic engine shared by all pipelines - the configured provider, or the hashing stub"""
+    engine = None
+    embedder = None
+
+    def factory():
+        nonlocal engine, embedder
+        if engine is None:
+            from embedding_providers import HashingEmbeddingProvider, get_embedding_provider
+            from server import SemanticSearchEngine
+
+            provider = get_embedding_provider(os.environ.get('OPENAI_API_KEY', ''))
+            if provider is None:
+                provider = HashingEmbeddingProvider()
+            engine = SemanticSearchEngine(provider)
+            if provider.name == 'hashing':
+                engine.embeddings_file = os.path.join(tempfile.mkdtemp(prefix='eval-'), 'embeddings.pkl')
+            if not engine.load_embeddings():
+                engine.create_embeddings(service.get_all_chunks(), service.near_duplicates.cluster_of)
+            embedder = provider.cache_slug
+        return engine
+
+    factory.embedder = lambda: embedder
+    return factory
+
+
+def evaluate(pipeline, queries: List[Tuple[str, Dict[Tuple, int], str]], ks: List[int]) -> Dict:
+    latencies = []
+    judged = []  # (kind, reciprocal rank, recall@k, nDCG@k) per judged query
+    for query, relevant, kind in queries:
+        start = time.perf_counter()
+        ranked = pipeline(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if not relevant:
+            continue  # nothing judged is in this corpus - latency only
+        judged.append((kind, reciprocal_rank(ranked, relevant),
+                       {k: recall_at_k(ranked, relevant, k) for k in ks},
+                       {k: ndcg_at_k(ranked, relevant, k) for k in ks}))
+
+    def mean(values):
+        values = list(values)
+        return round(sum(values) / len(values), 4) if values else None
+
+    def metrics(rows):
+        return {
+            'judged_queries': len(rows),
+            'recall': {f'@{k}': mean(row[2][k] for row in rows) for k in ks},
+            'ndcg': {f'@{k}': mean(row[3][k] for row in rows) for k in ks},
+            'mrr': mean(row[1] for row in rows),
+        }
+
+    kinds = sorted({row[0] for row in judged if row[0]})
+    return dict(metrics(judged), latency_ms=summarize(latencies),
+                by_kind={kind: metrics([row for row in judged if row[0] == kind]) for kind in kinds})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval pipelines against golden query -> source lists")
+    parser.add_argument('-g', '--golden', nargs='+', default=DEFAULT_GOLDEN, help="Golden set JSON files")
+    parser.add_argument('-p', '--pipelines', help="JSON list of pipeline configs (default: keyword, semantic, hybrid)")
+    parser.add_argument('-k', nargs='+', type=int, default=[5, 10, 15], help="Cutoffs for recall and nDCG")
+    parser.add_argument('--sichos', default=os.environ.get('SICHOS_FILE', str(ROOT / 'data' / 'sichos.json')))
+    parser.add_argument('--maamarim', default=os.environ.get('MAAMARIM_FILE', str(ROOT / 'data' / 'maamarim.json')))
+    parser.add_argument('-o', '--output', help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault('SEARCH_CACHE_SIZE', '0')  # measure retrieval, not the result cache
+    from server import ChabadSearchService
+
+    pipelines = DEFAULT_PIPELINES
+    if args.pipelines:
+        with open(args.pipelines, 'r', encoding='utf-8') as f:
+            pipelines = json.load(f)
+
+    service = ChabadSearchService(args.sichos, args.maamarim)
+    corpus = Corpus(service.get_all_chunks())
+
+    queries = []
+    coverage = []
+    for path in args.golden:
+        for golden in load_golden(path):
+            relevant: Dict[Tuple, int] = {}
+            for source in golden.sources:
+                key = corpus.resolve(source)
+                if key is not None:
+                    relevant[key] = max(relevant.get(key, 0), source.grade)
+            queries.append((golden.query, relevant, golden.kind))
+            coverage.append({'golden': os.path.basename(path), 'query': golden.query, 'kind': golden.kind,
+                             'judged': len(golden.sources), 'in_corpus': len(relevant)})
+
+    if not any(relevant for _, relevant, _ in queries):
+        print("⚠️  None of the judged sources are in the loaded corpus - reporting latency only. "
+              "Point --sichos/--maamarim at the books the golden sets were drawn from.", file=sys.stderr)
+
+    max_results = max(args.k)
+    engine_factory = make_engine_factory(service)
+    results = {}
+    for config in pipelines:
+        print(f"📏 {config['name']}...", file=sys.stderr)
+        pipeline = build_pipeline(config, service, engine_factory, max_results)
+        results[config['name']] = dict(evaluate(pipeline, queries, sorted(args.k)), config=config)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'corpus': [os.path.basename(args.sichos), os.path.basename(args.maamarim)],
+        'embedder': engine_factory.embedder(),
+        'coverage': coverage,
+        'pipelines': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Typo-tolerant vocabulary lookup
+Character trigram index narrows the vocabulary; a bounded Levenshtein check confirms each variant
+"""
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PAD = '\x02'
+
+
+def ngrams(word: str, n: int = 3) -> List[str]:
+    padded = PAD + word + PAD
+    return [padded[i:i + n] for i in range(max(len(padded) - n + 1, 1))]
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Edit distance, or None as soon as it must exceed max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+        if min(current) > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+def default_max_distance(word: str) -> int:
+    """One edit for short words, two from six letters - מלכות/מלכויות, malchus/malchuts"""
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 6 else 2
+
+
+class FuzzyIndex:
+    """Trigram postings over a fixed vocabulary"""
+
+    def __init__(self, vocabulary: Iterable[str], n: int = 3, max_checks: int = 300,
+                 frequencies: Optional[Dict[str, int]] = None):
+        self.n = n
+        self.max_checks = max_checks
+        self.frequencies = frequencies or {}  # e.g. document frequency - common spellings win ties
+        self.words: List[str] = []
+        self._grams: Dict[str, List[int]] = {}
+        for word in dict.fromkeys(vocabulary):
+            word_id = len(self.words)
+            self.words.append(word)
+            for gram in set(ngrams(word, n)):
+                self._grams.setdefault(gram, []).append(word_id)
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, word: str, max_distance: Optional[int] = None, limit: int = 5) -> List[Tuple[str, int]]:
+        """Vocabulary words within max_distance edits of word, closest first, excluding word itself"""
+        word = word.lower()
+        if max_distance is None:
+            max_distance = default_max_distance(word)
+        if max_distance <= 0:
+            return []
+
+        grams = ngrams(word, self.n)
+        # Each edit destroys at most n grams - fewer shared grams than this can't be within range
+        min_shared = max(len(grams) - max_distance * self.n, 1)
+        shared: Counter = Counter()
+        for gram in set(grams):
+            shared.update(self._grams.get(gram, ()))
+
+        matches = []
+        # Most shared grams first - the closest words are almost always among the first few hundred
+        for word_id, count in shared.most_common(self.max_checks):
+            if count < min_shared:
+                break
+            candidate = self.words[word_id]
+            if candidate == word:
+                continue
+            distance = bounded_levenshtein(word, candidate, max_distance)
+            if distance is not None:
+                matches.append((candidate, distance, count))
+
+        matches.sort(key=lambda m: (m[1], -self.frequencies.get(m[0], 0), -m[2], m[0]))
+        return [(candidate, distance) for candidate, distance, _ in matches[:limit]]
+
+    def variants(self, word: str, limit: int = 3) -> List[str]:
+        """Closest vocabulary words only - what a query planner adds to a term's OR group
+
+        Only the nearest distance counts, and rare look-alikes of a common spelling are left out
+        (התפילה -> התפלה, not הנפילה).
+        """
+        matches = self.lookup(word, limit=limit * 3)
+        if not matches:
+            return []
+        best_distance = matches[0][1]
+        best_frequency = self.frequencies.get(matches[0][0], 0)
+        return [candidate for candidate, distance in matches
+                if distance == best_distance and self.frequencies.get(candidate, 0) * 10 >= best_frequency][:limit]
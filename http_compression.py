@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Response compression, strong ETags and cache headers for the Flask apps
+Brotli is used when the optional brotli package is installed, gzip otherwise
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import Flask, Response, request
+
+try:
+    import brotli
+except ImportError:  # optional - gzip alone still covers every browser
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+class HTTPCompression:
+    """after_request hook - ETag, conditional GET, Accept-Encoding negotiation and Cache-Control"""
+
+    def __init__(self, app: Optional[Flask] = None, min_size: int = 500, gzip_level: int = 6,
+                 brotli_quality: int = 5, static_max_age: int = 300, cache_size: int = 64):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.static_max_age = static_max_age
+        self.cache_size = cache_size
+        # (body digest, encoding) -> compressed body, so index.html is compressed once per deploy
+        self._cache: 'OrderedDict[Tuple[str, str], bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        # send_from_directory otherwise marks static files no-cache
+        if app.config.get('SEND_FILE_MAX_AGE_DEFAULT') is None:
+            app.config['SEND_FILE_MAX_AGE_DEFAULT'] = self.static_max_age
+        app.after_request(self.process)
+
+    def process(self, response: Response) -> Response:
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.is_streamed and not response.direct_passthrough:
+            return response  # a generator - leave streaming responses alone
+        if not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        # send_from_directory hands us a file wrapper - only those files may sit in shared caches
+        static_file = response.direct_passthrough
+        if 'Cache-Control' not in response.headers:
+            if static_file and not request.path.startswith('/api/'):
+                response.headers['Cache-Control'] = f'public, max-age={self.static_max_age}'
+            else:
+                response.headers['Cache-Control'] = 'no-cache'  # always revalidate, but 304s are cheap
+
+        response.direct_passthrough = False
+        body = response.get_data()
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        response.vary.add('Accept-Encoding')
+
+        encoding = self._negotiate() if len(body) >= self.min_size else None
+        # Conditional requests only exist for GET/HEAD - a POST body (with its session id) never revalidates
+        if request.method in ('GET', 'HEAD'):
+            response.set_etag(f'{digest}-{encoding}' if encoding else digest)
+            response.make_conditional(request)
+            if response.status_code == 304:
+                return response
+
+        if encoding:
+            response.set_data(self._compress(body, digest, encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _negotiate(self) -> Optional[str]:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compress(self, body: bytes, digest: str, encoding: str) -> bytes:
+        key = (digest, encoding)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+        with self._lock:
+            self._cache[key] = compressed
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
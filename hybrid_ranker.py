@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Hybrid ranking for Chabad search
+Fuses keyword and semantic result lists into one ranked list per request
+"""
+
+import os
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for running keyword and semantic retrieval side by side
+_retrieval_pool = ThreadPoolExecutor(max_workers=int(os.environ.get('HYBRID_WORKERS', 8)),
+                                     thread_name_prefix='hybrid-retrieval')
+
+
+@dataclass(frozen=True)
+class RankedHit:
+    """One fused result, created fresh for every request"""
+    key: Tuple[str, Any]
+    result: Any  # SearchResult from the keyword or semantic stage
+    score: float
+    keyword_rank: Optional[int] = None   # 1-based rank in the keyword list
+    semantic_rank: Optional[int] = None  # 1-based rank in the semantic list
+    semantic_score: Optional[float] = None
+
+    def as_result(self):
+        """Return a copy of the underlying SearchResult carrying the fused score"""
+        return replace(self.result, similarity_score=self.score)
+
+
+@dataclass(frozen=True)
+class HybridConfig:
+    """Fusion settings - method is 'rrf' or 'weighted'"""
+    method: str = 'rrf'
+    keyword_weight: float = 1.0
+    semantic_weight: float = 1.0
+    rrf_k: int = 60
+    min_score: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> 'HybridConfig':
+        """Build config from HYBRID_* environment variables"""
+        return cls(
+            method=os.environ.get('HYBRID_METHOD', cls.method).lower(),
+            keyword_weight=float(os.environ.get('HYBRID_KEYWORD_WEIGHT', cls.keyword_weight)),
+            semantic_weight=float(os.environ.get('HYBRID_SEMANTIC_WEIGHT', cls.semantic_weight)),
+            rrf_k=int(os.environ.get('HYBRID_RRF_K', cls.rrf_k)),
+            min_score=float(os.environ.get('HYBRID_MIN_SCORE', cls.min_score)),
+        )
+
+
+def result_key(result) -> Tuple[str, Any]:
+    """Identity of a chunk across result lists"""
+    return (result.file_path, result.chunk_id)
+
+
+class HybridRanker:
+    """Reciprocal-rank or weighted-score fusion of keyword and semantic hits"""
+
+    def __init__(self, config: Optional[HybridConfig] = None):
+        self.config = config or HybridConfig()
+        if self.config.method not in ('rrf', 'weighted'):
+            raise ValueError(f"Unknown hybrid method: {self.config.method}")
+
+    def fuse(self, keyword_results: Sequence, semantic_results: Sequence,
+             max_results: int = 15,
+             cluster_of: Optional[Callable[[Tuple[str, Any]], Any]] = None) -> List[RankedHit]:
+        """Combine both lists without touching the input objects
+
+        With cluster_of, only the best-ranked chunk of each near-duplicate cluster is kept.
+        """
+        keyword_ranks = self._ranks(keyword_results)
+        semantic_ranks = self._ranks(semantic_results)
+
+        # Prefer the semantic copy of a chunk - it carries the similarity score
+        by_key: Dict[Tuple[str, Any], Any] = {}
+        for result in keyword_results:
+            by_key.setdefault(result_key(result), result)
+        for result in semantic_results:
+            by_key[result_key(result)] = result
+
+        if self.config.method == 'rrf':
+            scores = self._rrf_scores(keyword_ranks, semantic_ranks)
+        else:
+            scores = self._weighted_scores(keyword_ranks, semantic_results)
+
+        hits = []
+        for key, score in scores.items():
+            if score < self.config.min_score:
+                continue
+            result = by_key[key]
+            semantic_rank = semantic_ranks.get(key)
+            hits.append(RankedHit(
+                key=key,
+                result=result,
+                score=score,
+                keyword_rank=keyword_ranks.get(key),
+                semantic_rank=semantic_rank,
+                semantic_score=result.similarity_score if semantic_rank else None,
+            ))
+
+        # Ties broken by keyword rank, which already encodes term coverage
+        hits.sort(key=lambda h: (-h.score, h.keyword_rank or len(keyword_ranks) + 1))
+        if cluster_of is not None:
+            clusters = set()
+            unique = []
+            for hit in hits:
+                cluster = cluster_of(hit.key)
+                if cluster not in clusters:
+                    clusters.add(cluster)
+                    unique.append(hit)
+            hits = unique
+        return hits[:max_results]
+
+    def search(self, keyword_search: Callable[[], Sequence],
+               semantic_search: Optional[Callable[[], Sequence]] = None,
+               max_results: int = 15,
+               cluster_of: Optional[Callable[[Tuple[str, Any]], Any]] = None) -> List[RankedHit]:
+        """Run both retrievals in parallel and fuse the results"""
+        # Each task runs in a copy of the caller's context so request-scoped state follows it
+        keyword_future = _retrieval_pool.submit(contextvars.copy_context().run, keyword_search)
+        semantic_future = (_retrieval_pool.submit(contextvars.copy_context().run, semantic_search)
+                           if semantic_search else None)
+
+        keyword_results = keyword_future.result()
+        semantic_results = []
+        if semantic_future is not None:
+            try:
+                semantic_results = semantic_future.result()
+            except Exception as e:
+                # Keyword results are still useful if the embedding call fails
+                logger.error(f"Semantic retrieval failed, using keyword only: {e}")
+
+        logger.info(f"Keyword: {len(keyword_results)} results, Semantic: {len(semantic_results)} results")
+        return self.fuse(keyword_results, semantic_results, max_results, cluster_of)
+
+    def _ranks(self, results: Sequence) -> Dict[Tuple[str, Any], int]:
+        ranks = {}
+        for rank, result in enumerate(results, 1):
+            ranks.setdefault(result_key(result), rank)
+        return ranks
+
+    def _rrf_scores(self, keyword_ranks: Dict, semantic_ranks: Dict) -> Dict[Tuple[str, Any], float]:
+        """score = sum(weight / (k + rank)) over the lists a chunk appears in"""
+        k = self.config.rrf_k
+        scores: Dict[Tuple[str, Any], float] = {}
+        for key, rank in keyword_ranks.items():
+            scores[key] = scores.get(key, 0.0) + self.config.keyword_weight / (k + rank)
+        for key, rank in semantic_ranks.items():
+            scores[key] = scores.get(key, 0.0) + self.config.semantic_weight / (k + rank)
+        return scores
+
+    def _weighted_scores(self, keyword_ranks: Dict, semantic_results: Sequence) -> Dict[Tuple[str, Any], float]:
+        """Weighted sum of min-max normalized semantic scores and rank-based keyword scores"""
+        scores: Dict[Tuple[str, Any], float] = {}
+
+        # Keyword search has no score of its own - map rank 1..n onto 1..1/n
+        n = len(keyword_ranks)
+        for key, rank in keyword_ranks.items():
+            scores[key] = self.config.keyword_weight * (n - rank + 1) / n
+
+        if semantic_results:
+            raw = [r.similarity_score for r in semantic_results]
+            low, high = min(raw), max(raw)
+            spread = (high - low) or 1.0
+            for result in semantic_results:
+                key = result_key(result)
+                normalized = (result.similarity_score - low) / spread if high > low else 1.0
+                scores[key] = scores.get(key, 0.0) + self.config.semantic_weight * normalized
+
+        return scores
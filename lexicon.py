@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Query lexicon
+Transliterations, spelling variants, synonyms and ר״ת from lexicon.json, matched greedily with a word trie
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from fuzzy_index import FuzzyIndex
+
+DEFAULT_LEXICON = Path(__file__).parent / 'lexicon.json'
+
+# Gershayim and geresh typed from a Hebrew keyboard - the corpus uses ASCII quotes
+QUOTE_FOLD = str.maketrans({'״': '"', '׳': "'", '“': '"', '”': '"', '’': "'"})
+LATIN_WORD_RE = re.compile(r"^[a-z][a-z'-]*$")
+# Misspelled transliterations are corrected by one edit, and only from this length - shorter English
+# words are one edit from a key too often (torch/torah, unit/unity)
+MIN_CORRECTED_LETTERS = 6
+
+
+def normalize_word(word: str) -> str:
+    return word.translate(QUOTE_FOLD).lower()
+
+
+@dataclass(frozen=True)
+class LexiconEntry:
+    """One concept - the Hebrew forms that all count as a match for it"""
+    canonical: str
+    forms: Tuple[str, ...]  # canonical first, then synonyms, spellings and expansions
+
+
+@dataclass(frozen=True)
+class Segment:
+    """A run of query words - a lexicon match or a single plain word"""
+    text: str
+    entry: Optional[LexiconEntry] = None
+
+
+class Lexicon:
+    """Word trie over every known key; each key resolves to the Hebrew form it stands for"""
+
+    def __init__(self, stopwords: Iterable[str] = (), version: str = ''):
+        self.version = version  # content hash - part of any result cache key
+        self.stopwords: FrozenSet[str] = frozenset(normalize_word(w) for w in stopwords)
+        self._trie: Dict = {}
+        # Union-find over forms - concepts sharing a form (תומ"צ / תורה ומצוות) are one group
+        self._parent: Dict[str, str] = {}
+        self._members: Dict[str, List[str]] = {}  # root form -> every form of its group
+        # Single-word transliterations -> form, for correcting misspelled ones - never English glosses
+        self._latin_keys: Dict[str, str] = {}
+        self._latin_fuzzy: Optional[FuzzyIndex] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict, version: str = '') -> 'Lexicon':
+        lexicon = cls(data.get('stopwords', ()), version)
+        for concept in data.get('concepts', ()):
+            lexicon.add([concept['he']] + list(concept.get('synonyms', ())), concept.get('variants', ()),
+                        concept.get('glosses', ()))
+        for abbreviation, expansion in data.get('abbreviations', {}).items():
+            lexicon.add([abbreviation, expansion])
+        return lexicon
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'Lexicon':
+        with open(path or DEFAULT_LEXICON, 'rb') as f:
+            raw = f.read()
+        return cls.from_dict(json.loads(raw.decode('utf-8')), hashlib.sha256(raw).hexdigest()[:12])
+
+    def add(self, forms: List[str], transliterations: Iterable[str] = (), glosses: Iterable[str] = ()):
+        """Register a concept - forms are searched in the text, transliterations and glosses map to the first form
+
+        Only transliterations are spelling-corrected; a gloss is an English word and must be typed as-is.
+        """
+        forms = [normalize_word(f) for f in forms]
+        for form in forms:
+            if form not in self._parent:
+                self._parent[form] = form
+                self._members[form] = [form]
+            self._union(forms[0], form)
+            self._insert(form, form)  # a form typed as-is stays the search term
+        for key in transliterations:
+            key = normalize_word(key)
+            self._insert(key, forms[0])
+            if LATIN_WORD_RE.match(key):
+                self._latin_keys.setdefault(key, forms[0])
+        for key in glosses:
+            self._insert(normalize_word(key), forms[0])
+        self._latin_fuzzy = None
+
+    def _find(self, form: str) -> str:
+        root = form
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[form] != root:
+            self._parent[form], form = root, self._parent[form]
+        return root
+
+    def _union(self, first: str, other: str):
+        root, other_root = self._find(first), self._find(other)
+        if root != other_root:
+            self._parent[other_root] = root
+            self._members[root] += self._members.pop(other_root)
+
+    def _insert(self, key: str, form: str):
+        node = self._trie
+        for word in key.split():
+            node = node.setdefault(word, {})
+        node.setdefault('', form)  # first registration of a key wins
+
+    def entry(self, form: str) -> Optional[LexiconEntry]:
+        form = normalize_word(form)
+        if form not in self._parent:
+            return None
+        group = self._members[self._find(form)]
+        return LexiconEntry(form, (form,) + tuple(f for f in group if f != form))
+
+    def is_stopword(self, word: str) -> bool:
+        return normalize_word(word) in self.stopwords
+
+    def segment(self, words: List[str]) -> List[Segment]:
+        """Longest lexicon match at each position, plain words in between"""
+        normalized = [normalize_word(w) for w in words]
+        segments: List[Segment] = []
+        i = 0
+        while i < len(words):
+            node = self._trie
+            match: Optional[Tuple[int, str]] = None
+            for j in range(i, len(words)):
+                node = node.get(normalized[j])
+                if node is None:
+                    break
+                if '' in node:
+                    match = (j + 1, node[''])
+            if match is None:
+                # A misspelled transliteration (malchuss, chasidus) still finds its concept
+                form = None if self.is_stopword(words[i]) else self.correct(words[i])
+                segments.append(Segment(form, self.entry(form)) if form else Segment(words[i]))
+                i += 1
+            else:
+                end, form = match
+                segments.append(Segment(form, self.entry(form)))
+                i = end
+        return segments
+
+    def correct(self, word: str) -> Optional[str]:
+        """Form of the one closest transliteration key, if word is a Latin near-miss of it"""
+        word = normalize_word(word)
+        if len(word) < MIN_CORRECTED_LETTERS or not LATIN_WORD_RE.match(word):
+            return None
+        if self._latin_fuzzy is None:
+            self._latin_fuzzy = FuzzyIndex(self._latin_keys)
+        matches = self._latin_fuzzy.lookup(word, max_distance=1, limit=2)
+        if not matches:
+            return None
+        best = self._latin_keys[matches[0][0]]
+        if len(matches) > 1 and matches[1][1] == matches[0][1] and self._latin_keys[matches[1][0]] != best:
+            return None  # equally close to two concepts - don't guess
+        return best
+
+    def expansions(self, term: str) -> Tuple[str, ...]:
+        """Other forms that count as a match for term - empty unless term is a lexicon form"""
+        entry = self.entry(term)
+        return entry.forms[1:] if entry is not None else ()
+
+
+_lexicons: Dict[str, Lexicon] = {}
+_lexicons_lock = threading.Lock()
+
+
+def get_lexicon(path: Optional[str] = None) -> Lexicon:
+    """Process-wide lexicon from LEXICON_FILE or the bundled lexicon.json"""
+    path = path or os.environ.get('LEXICON_FILE') or str(DEFAULT_LEXICON)
+    with _lexicons_lock:
+        lexicon = _lexicons.get(path)
+        if lexicon is None:
+            lexicon = _lexicons[path] = Lexicon.load(path)
+        return lexicon
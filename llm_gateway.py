@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Shared gateway for Anthropic Messages API calls from the proxies
+One pooled keep-alive session, configurable timeouts, jittered retries and streaming
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_MESSAGES_URL = 'https://api.anthropic.com/v1/messages'
+ANTHROPIC_VERSION = '2023-06-01'
+# Rate limited and overloaded - worth another try after a pause
+RETRYABLE_STATUS = (429, 529)
+
+
+class LLMGatewayError(Exception):
+    """A Claude call that failed after all retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, body: str = '',
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code is None or self.status_code in RETRYABLE_STATUS or self.status_code >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header - delta-seconds or an HTTP date; None if unusable"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None  # malformed - the jittered backoff decides
+
+
+class AnthropicGateway:
+    """Thread-safe client for POST /v1/messages over a pooled requests.Session"""
+
+    def __init__(self, api_key: Optional[str] = None, pool_size: int = 10,
+                 connect_timeout: float = 5.0, read_timeout: float = 120.0,
+                 max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.api_key = api_key
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # Keep-alive connections are reused across requests and threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+
+    def create_message(self, payload: Dict[str, Any], api_key: Optional[str] = None,
+                       timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                       retry_timeouts: bool = False) -> Dict[str, Any]:
+        """Send one Messages API request and return the parsed JSON response
+
+        A read timeout is only retried with retry_timeouts - Claude may still be generating (and billing)
+        the first attempt.
+        """
+        response = self._post(payload, api_key, timeout, max_retries, stream=False, retry_timeouts=retry_timeouts)
+        return response.json()
+
+    def stream_message(self, payload: Dict[str, Any], api_key: Optional[str] = None,
+                       timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                       retry_timeouts: bool = False) -> Iterator[str]:
+        """Yield text deltas as Claude produces them (server-sent events)"""
+        # Connect (and retry) now so failures surface before the caller starts a response
+        response = self._post(dict(payload, stream=True), api_key, timeout, max_retries, stream=True,
+                              retry_timeouts=retry_timeouts)
+        return self._iter_text(response)
+
+    @staticmethod
+    def _iter_text(response: requests.Response) -> Iterator[str]:
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[len('data:'):].strip())
+                if event.get('type') == 'content_block_delta':
+                    text = event.get('delta', {}).get('text')
+                    if text:
+                        yield text
+                elif event.get('type') == 'error':
+                    error = event.get('error', {})
+                    raise LLMGatewayError(f"Claude API error: {error.get('type', 'stream_error')} - "
+                                          f"{error.get('message', '')}")
+        finally:
+            response.close()
+
+    def _post(self, payload: Dict[str, Any], api_key: Optional[str], timeout: Optional[float],
+              max_retries: Optional[int], stream: bool, retry_timeouts: bool = False) -> requests.Response:
+        headers = {
+            'Content-Type': 'application/json',
+            'x-api-key': api_key or self.api_key or '',
+            'anthropic-version': ANTHROPIC_VERSION
+        }
+        request_timeout = (self.connect_timeout, timeout or self.read_timeout)
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        attempt = 0
+        while True:
+            error: LLMGatewayError
+            try:
+                response = self.session.post(ANTHROPIC_MESSAGES_URL, headers=headers, json=payload,
+                                             timeout=request_timeout, stream=stream)
+                if response.status_code == 200:
+                    return response
+
+                retry_after = response.headers.get('retry-after')
+                message = f'Claude API error: {response.status_code}'
+                if response.text:
+                    message += f' - {response.text}'
+                error = LLMGatewayError(message, response.status_code, response.text,
+                                        parse_retry_after(retry_after))
+                response.close()
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise error
+            except requests.ConnectionError as e:
+                # Includes connect timeouts - the request never reached Claude, so a retry is safe
+                error = LLMGatewayError(f'Claude API request failed: {e}')
+            except requests.Timeout as e:
+                error = LLMGatewayError(f'Claude API request timed out: {e}')
+                if not retry_timeouts:
+                    raise error
+
+            attempt += 1
+            if attempt > max_retries:
+                raise error
+
+            # Full jitter keeps parallel callers from retrying in lockstep
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            if error.retry_after:
+                delay = max(delay, error.retry_after)
+            logger.warning(f"{error} - retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+_gateway: Optional[AnthropicGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> AnthropicGateway:
+    """Process-wide gateway configured from LLM_* environment variables"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = AnthropicGateway(
+                api_key=os.getenv('CLAUDE_API_KEY') or os.getenv('ANTHROPIC_API_KEY'),
+                pool_size=int(os.getenv('LLM_POOL_SIZE', 10)),
+                connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', 5)),
+                read_timeout=float(os.getenv('LLM_READ_TIMEOUT', 120)),
+                max_retries=int(os.getenv('LLM_MAX_RETRIES', 3)),
+            )
+        return _gateway
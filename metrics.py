@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Lightweight request metrics
+Timing spans per stage, a Server-Timing header and Prometheus text exposition - no dependencies
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, Response, g, request
+
+# Seconds - from an in-memory dict lookup up to a slow Claude call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+# Spans recorded during the current request; worker threads share the list via copy_context()
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    'request_spans', default=None)
+
+
+def _labels(labels: Dict[str, object]) -> LabelSet:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelSet, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = (k + '="' + v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Counters, histograms and callback gauges, rendered in Prometheus text format"""
+
+    def __init__(self, namespace: str = 'chabad'):
+        self.namespace = namespace
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._histograms: Dict[str, Dict[LabelSet, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str):
+        self._help[name] = ('counter', help_text)
+        self._counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._help[name] = ('histogram', help_text)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict[str, float]]):
+        """Gauges read at scrape time, e.g. a cache's stats() - exposed as <prefix>_<key>"""
+        self._collectors.append((prefix, collect))
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self._counters.items():
+                full = f'{self.namespace}_{name}'
+                lines += [f'# HELP {full} {self._help[name][1]}', f'# TYPE {full} counter']
+                lines += [f'{full}{_format_labels(labels)} {value:g}' for labels, value in sorted(series.items())]
+
+            for name, series in self._histograms.items():
+                full = f'{self.namespace}_{name}'
+                lines += [f'# HELP {full} {self._help[name][1]}', f'# TYPE {full} histogram']
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{full}_bucket{_format_labels(labels, (("le", f"{bound:g}"),))} {count}')
+                    lines.append(f'{full}_bucket{_format_labels(labels, (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{full}_sum{_format_labels(labels)} {histogram.total:.6f}')
+                    lines.append(f'{full}_count{_format_labels(labels)} {histogram.count}')
+
+        for prefix, collect in self._collectors:
+            try:
+                values = collect()
+            except Exception:
+                continue  # a broken collector must not break the scrape
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                full = f'{self.namespace}_{prefix}_{key}'
+                lines += [f'# TYPE {full} gauge', f'{full} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+metrics.histogram('stage_seconds', 'Time spent in each search pipeline stage')
+metrics.histogram('http_request_seconds', 'End-to-end request latency')
+metrics.counter('http_requests_total', 'Requests by endpoint and status')
+metrics.counter('llm_tokens_total', 'Claude tokens by kind (input, output, cache_read, cache_write)')
+metrics.counter('errors_total', 'Failures by stage')
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block - recorded in the stage histogram and in the request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('stage_seconds', elapsed, stage=stage)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def record_error(stage: str):
+    metrics.inc('errors_total', stage=stage)
+
+
+def record_llm_usage(usage) -> None:
+    """Token counts from an Anthropic response's usage block"""
+    if usage is None:
+        return
+    for kind, attribute in (('input', 'input_tokens'), ('output', 'output_tokens'),
+                            ('cache_read', 'cache_read_input_tokens'),
+                            ('cache_write', 'cache_creation_input_tokens')):
+        value = getattr(usage, attribute, None)
+        if value:
+            metrics.inc('llm_tokens_total', value, kind=kind)
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value - repeated stages are summed, durations in ms"""
+    totals: Dict[str, float] = {}
+    for stage, elapsed in spans:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    entries = [f'{stage};dur={elapsed * 1000:.1f}' for stage, elapsed in totals.items()]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def init_app(app: Flask, endpoint: str = '/metrics'):
+    """Per-request spans and Server-Timing, request histograms, and the scrape endpoint"""
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _request_spans.set([])
+
+    @app.after_request
+    def _finish_request(response: Response) -> Response:
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        spans = _request_spans.get() or []
+        _request_spans.reset(g.pop('metrics_token'))
+
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route != endpoint:
+            response.headers['Server-Timing'] = server_timing(spans, elapsed)
+            metrics.observe('http_request_seconds', elapsed, endpoint=route, method=request.method)
+            metrics.inc('http_requests_total', endpoint=route, method=request.method, status=response.status_code)
+        return response
+
+    @app.route(endpoint)
+    def _metrics_endpoint():
+        # Every scrape must reach the process - a cached copy would flatten the counters
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4',
+                        headers={'Cache-Control': 'no-store'})
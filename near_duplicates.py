@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate chunk detection
+MinHash signatures over word shingles, LSH banding for candidate pairs, union-find into clusters
+"""
+
+import hashlib
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Set, Tuple
+
+from text_index import clean_text, tokenize
+
+MAX_HASH = (1 << 64) - 1
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """64-bit hashes of every run of size words - a short text is one shingle"""
+    words = tokenize(clean_text(text))
+    runs = [' '.join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))]
+    return {int.from_bytes(hashlib.blake2b(run.encode('utf-8'), digest_size=8).digest(), 'big')
+            for run in runs if run}
+
+
+def minhash(hashes: Set[int], num_hashes: int = 64) -> Tuple[int, ...]:
+    """One-permutation MinHash - the minimum per hash bucket, empty buckets borrowed from the next one
+
+    Each shingle is hashed once instead of num_hashes times; equal slots still estimate Jaccard similarity.
+    """
+    slots = [MAX_HASH] * num_hashes
+    for h in hashes:
+        bucket = h % num_hashes
+        if h < slots[bucket]:
+            slots[bucket] = h
+    if not hashes:
+        return tuple(slots)
+    # Densify - a bucket no shingle fell into copies the next filled bucket to its right
+    filled = [i for i, value in enumerate(slots) if value != MAX_HASH]
+    result = list(slots)
+    for i in range(num_hashes):
+        if slots[i] == MAX_HASH:
+            donor = next((j for j in filled if j > i), filled[0])
+            result[i] = slots[donor]
+    return tuple(result)
+
+
+def similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class NearDuplicates:
+    """Cluster ids for chunks whose text is (almost) the same - the first chunk added is the representative"""
+
+    def __init__(self, threshold: float = 0.8, num_hashes: int = 64, bands: int = 16, shingle_size: int = 5):
+        if num_hashes % bands:
+            raise ValueError('num_hashes must be a multiple of bands')
+        self.threshold = threshold
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self._signatures: Dict[Hashable, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Hashable]] = defaultdict(list)
+        self._parent: Dict[Hashable, Hashable] = {}
+        self._order: Dict[Hashable, int] = {}
+
+    @classmethod
+    def from_env(cls) -> 'NearDuplicates':
+        return cls(threshold=float(os.environ.get('NEAR_DUP_THRESHOLD', 0.8)))
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def add(self, key: Hashable, text: str):
+        """Index one chunk, joining the cluster of any earlier chunk it nearly repeats"""
+        if self.threshold <= 0:
+            return  # disabled - every chunk is its own cluster
+        hashes = shingles(text, self.shingle_size)
+        if not hashes:
+            return  # no words - every such chunk would share the empty signature and collapse into one
+        signature = minhash(hashes, self.num_hashes)
+        self._signatures[key] = signature
+        self._parent[key] = key
+        self._order[key] = len(self._order)
+
+        rows = self.num_hashes // self.bands
+        candidates = set()
+        for band in range(self.bands):
+            bucket = self._buckets[(band, signature[band * rows:(band + 1) * rows])]
+            candidates.update(bucket)
+            bucket.append(key)
+        for other in candidates:
+            # Banding finds pairs that share any band - only the estimated similarity decides
+            if similarity(signature, self._signatures[other]) >= self.threshold:
+                self._union(other, key)
+
+    def _find(self, key: Hashable) -> Hashable:
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[key] != root:
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _union(self, earlier: Hashable, later: Hashable):
+        earlier_root, later_root = self._find(earlier), self._find(later)
+        if earlier_root == later_root:
+            return
+        # Roots are always the earliest chunk of their cluster
+        if self._order[later_root] < self._order[earlier_root]:
+            earlier_root, later_root = later_root, earlier_root
+        self._parent[later_root] = earlier_root
+
+    def cluster_of(self, key: Hashable) -> Hashable:
+        """Representative chunk of key's cluster - key itself when it has no duplicates"""
+        return self._find(key) if key in self._parent else key
+
+    def clusters(self) -> List[List[Hashable]]:
+        """Clusters with more than one member, each in the order the chunks were added"""
+        members: Dict[Hashable, List[Hashable]] = defaultdict(list)
+        for key in self._signatures:
+            members[self._find(key)].append(key)
+        return [group for group in members.values() if len(group) > 1]
+
+    def collapse(self, results: Iterable[Any], key: Callable[[Any], Hashable]) -> List[Any]:
+        """Keep the best-ranked result of each cluster, in order"""
+        seen = set()
+        collapsed = []
+        for result in results:
+            cluster = self.cluster_of(key(result))
+            if cluster not in seen:
+                seen.add(cluster)
+                collapsed.append(result)
+        return collapsed
+
+    def stats(self) -> Dict[str, Any]:
+        clusters = self.clusters()
+        return {
+            'chunks': len(self._signatures),
+            'clusters': len(clusters),
+            'duplicates': sum(len(group) - 1 for group in clusters),
+            'threshold': self.threshold,
+        }
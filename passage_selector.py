@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Passage selection for LLM context
+Splits chunks into sentences once and picks the most relevant windows per query
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+FOOTNOTE_RE = re.compile(r'<footnote>\d+</footnote>')
+PAGE_MARKER_RE = re.compile(r'<<<PAGE [^>]*>>>')
+TAG_RE = re.compile(r'<[^>]+>')
+# Sentence ends: . : ? ! followed by space, or a line break (seifim start on new lines)
+SENTENCE_END_RE = re.compile(r'(?<=[.:?!])\s+|\n+')
+SPACES_RE = re.compile(r'[ \t]+')
+
+
+def clean_passage_text(text: str) -> str:
+    """Strip footnote markers, page markers and HTML tags"""
+    text = FOOTNOTE_RE.sub('', text)
+    text = PAGE_MARKER_RE.sub('', text)
+    text = TAG_RE.sub('', text)
+    return SPACES_RE.sub(' ', text)
+
+
+def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+    """Split a chunk into sentences, gluing very short fragments onto the previous one"""
+    sentences: List[str] = []
+    for piece in SENTENCE_END_RE.split(clean_passage_text(text)):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and len(piece) < min_chars:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Claude token count - Hebrew runs ~2 chars per token, Latin ~4"""
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    return (non_ascii + 1) // 2 + (len(text) - non_ascii + 3) // 4
+
+
+class PassageIndex:
+    """Per-chunk sentence splits, built once when the corpus is loaded"""
+
+    def __init__(self):
+        self._sentences: Dict[Tuple[str, Any], List[str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: Tuple[str, Any], text: str):
+        self._sentences[key] = split_sentences(text)
+
+    def sentences(self, key: Tuple[str, Any], text: str = '') -> List[str]:
+        """Sentences for a chunk, splitting on the fly for chunks not indexed yet"""
+        sentences = self._sentences.get(key)
+        if sentences is None:
+            sentences = split_sentences(text)
+            with self._lock:
+                self._sentences[key] = sentences
+        return sentences
+
+    def __len__(self):
+        return len(self._sentences)
+
+
+@dataclass(frozen=True)
+class Passage:
+    """A contiguous run of sentences selected from one chunk"""
+    start: int  # first sentence index
+    end: int    # one past the last sentence index
+    text: str
+    score: float
+
+
+class PassageSelector:
+    """Picks the highest-scoring sentence windows of a chunk within a token budget"""
+
+    def __init__(self, index: PassageIndex, window: int = 1,
+                 similarity_fn: Optional[Callable[[str, List[str]], Sequence[float]]] = None):
+        self.index = index
+        self.window = window  # sentences kept on each side of a matching sentence
+        # Optional (query, sentences) -> scores, e.g. a local embedding model
+        self.similarity_fn = similarity_fn
+
+    def select(self, result, terms: Sequence[str], token_budget: int, query: str = '') -> List[Passage]:
+        """Return passages in document order, most relevant first until the budget is spent"""
+        sentences = self.index.sentences((result.file_path, result.chunk_id), result.text)
+        if not sentences:
+            return []
+
+        scores = self._score_sentences(sentences, terms, query)
+        seeds = sorted((i for i, s in enumerate(scores) if s > 0), key=lambda i: -scores[i])
+        if not seeds:
+            # Nothing matched - the opening of the chunk is the best guess
+            seeds = [0]
+
+        chosen: List[Tuple[int, int]] = []
+        used = 0
+        for seed in seeds:
+            start = max(0, seed - self.window)
+            end = min(len(sentences), seed + self.window + 1)
+            if any(start < c_end and c_start < end for c_start, c_end in chosen):
+                continue
+            cost = sum(estimate_tokens(s) for s in sentences[start:end])
+            if used + cost > token_budget:
+                if chosen:
+                    continue
+                # Always return something - fall back to the seed sentence alone
+                start, end = seed, seed + 1
+                cost = estimate_tokens(sentences[seed])
+            chosen.append((start, end))
+            used += cost
+            if used >= token_budget:
+                break
+
+        passages = []
+        for start, end in sorted(chosen):
+            text = ' '.join(sentences[start:end])
+            if used > token_budget and len(chosen) == 1:
+                # A single oversized sentence - trim it to the budget
+                text = text[:token_budget * 2]
+            passages.append(Passage(start, end, text, sum(scores[start:end])))
+        return passages
+
+    def format_excerpt(self, result, terms: Sequence[str], token_budget: int, query: str = '') -> str:
+        """Join selected passages, marking gaps between them"""
+        passages = self.select(result, terms, token_budget, query)
+        if not passages:
+            return ''
+
+        total = len(self.index.sentences((result.file_path, result.chunk_id), result.text))
+        parts = []
+        if passages[0].start > 0:
+            parts.append('...')
+        for i, passage in enumerate(passages):
+            if i > 0:
+                parts.append('...')
+            parts.append(passage.text)
+        if passages[-1].end < total:
+            parts.append('...')
+        return ' '.join(parts)
+
+    def _score_sentences(self, sentences: List[str], terms: Sequence[str], query: str) -> List[float]:
+        # Multi-word phrases are stronger evidence than single words
+        weighted_terms = [(t, len(t.split())) for t in terms if t]
+        scores = []
+        for sentence in sentences:
+            lowered = sentence.lower()
+            scores.append(float(sum(w for t, w in weighted_terms if t.lower() in lowered)))
+
+        if self.similarity_fn and query:
+            for i, similarity in enumerate(self.similarity_fn(query, sentences)):
+                scores[i] += max(0.0, float(similarity))
+
+        return scores
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted prompt assembly for Claude
+Trims history and sources to a budget and marks static prefixes for prompt caching
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+from passage_selector import estimate_tokens
+
+TAG_RE = re.compile(r'<[^>]+>')
+SPACES_RE = re.compile(r'\s+')
+
+CACHE_CONTROL = {'type': 'ephemeral'}
+# Shorter prefixes are never cached (1024 for Sonnet/Opus) - a breakpoint before this is a no-op
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text so that its estimated token count fits max_tokens"""
+    if max_tokens <= 0:
+        return ''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # Binary search on length - estimate_tokens is monotonic in the prefix length
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens - 1:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + '…'
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Plain text of a message whose content is a string or a list of blocks"""
+    content = message.get('content', '')
+    if isinstance(content, list):
+        return '\n'.join(block.get('text', '') for block in content if isinstance(block, dict))
+    return str(content)
+
+
+class PromptBuilder:
+    """Builds `system` and `messages` for the Messages API within an input token budget"""
+
+    def __init__(self, system_prompt: str, max_input_tokens: int = 6000,
+                 history_tokens: int = 2500, max_turn_tokens: int = 600,
+                 cache_prompt: bool = True):
+        self.system_prompt = system_prompt
+        self.max_input_tokens = max_input_tokens
+        self.history_tokens = history_tokens    # ceiling for all previous turns together
+        self.max_turn_tokens = max_turn_tokens  # ceiling for any single previous turn
+        self.cache_prompt = cache_prompt
+        self.system_tokens = estimate_tokens(system_prompt)
+
+    @property
+    def user_budget(self) -> int:
+        """Tokens left for the new user message once the system prompt is in"""
+        return self.max_input_tokens - self.system_tokens
+
+    def system_blocks(self) -> List[Dict[str, Any]]:
+        """The static system prompt, marked for caching once it is long enough to be cached"""
+        block: Dict[str, Any] = {'type': 'text', 'text': self.system_prompt}
+        if self.cache_prompt and self.system_tokens >= MIN_CACHEABLE_TOKENS:
+            block['cache_control'] = CACHE_CONTROL
+        return [block]
+
+    def build(self, user_message: str, history: Optional[List[Dict[str, Any]]] = None,
+              truncate: bool = True) -> Dict[str, Any]:
+        """Return {'system', 'messages', 'estimated_tokens'} for one call
+
+        An oversized user message is cut to the budget, or raises ValueError with truncate=False.
+        """
+        available = self.user_budget
+
+        # The new question and its sources come first; history gets what is left
+        user_tokens = estimate_tokens(user_message)
+        if user_tokens > available:
+            if not truncate:
+                raise ValueError(f"User message is ~{user_tokens} tokens, the budget is {available}")
+            user_message = truncate_to_tokens(user_message, available)
+            user_tokens = estimate_tokens(user_message)
+
+        history_budget = min(self.history_tokens, available - user_tokens)
+        trimmed_history, history_used = self._trim_history(history or [], history_budget)
+
+        messages = trimmed_history + [{'role': 'user', 'content': user_message}]
+        return {
+            'system': self.system_blocks(),
+            'messages': messages,
+            'estimated_tokens': self.system_tokens + history_used + user_tokens,
+        }
+
+    def _trim_history(self, history: List[Dict[str, Any]], budget: int):
+        """Keep the most recent turns that fit the budget, oldest dropped first"""
+        kept: List[Dict[str, Any]] = []
+        used = 0
+        for message in reversed(history):
+            role = message.get('role')
+            if role not in ('user', 'assistant'):
+                continue
+            # Answers are stored as HTML - the markup is pure token overhead
+            text = SPACES_RE.sub(' ', TAG_RE.sub(' ', message_text(message))).strip()
+            text = truncate_to_tokens(text, self.max_turn_tokens)
+            if not text:
+                continue  # an empty answer (JSON or demo mode) - skip it, not everything before it
+            if (not kept and role == 'user') or (kept and kept[-1]['role'] == role):
+                continue  # unanswered question or a turn whose pair was skipped - keep turns alternating
+            cost = estimate_tokens(text)
+            if used + cost > budget:
+                break
+            kept.append({'role': role, 'content': text})
+            used += cost
+        kept.reverse()
+
+        # The API requires alternating turns starting with the user
+        while kept and kept[0]['role'] != 'user':
+            used -= estimate_tokens(kept.pop(0)['content'])
+
+        if kept and self.cache_prompt and self.system_tokens + used >= MIN_CACHEABLE_TOKENS:
+            # Cache everything up to the last previous turn so follow-ups reuse it
+            last = kept[-1]
+            last['content'] = [{'type': 'text', 'text': last['content'], 'cache_control': CACHE_CONTROL}]
+
+        return kept, used
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Keyword query planning over the inverted index
+Drops non-selective terms, evaluates the rest rarest-first over posting lists within a time budget
+"""
+
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from text_index import InvertedIndex
+
+
+@dataclass(frozen=True)
+class PlannedTerm:
+    """A search term and the variants any of which counts as a match (OR group)"""
+    text: str
+    variants: Tuple[str, ...]
+    doc_freq: int  # upper bound from postings - exact once evaluated
+
+
+@dataclass
+class QueryPlan:
+    terms: List[PlannedTerm]                                      # selective terms, rarest first
+    common: List[PlannedTerm] = field(default_factory=list)       # only used if the selective ones find nothing
+    dropped: List[Tuple[str, str]] = field(default_factory=list)  # (term, reason)
+    evaluated: int = 0
+    timed_out: bool = False
+
+    def describe(self) -> Dict:
+        return {
+            'terms': [(t.text, t.doc_freq) for t in self.terms],
+            'common': [(t.text, t.doc_freq) for t in self.common],
+            'dropped': self.dropped,
+            'evaluated': self.evaluated,
+            'timed_out': self.timed_out,
+        }
+
+
+# A chunk matching only a term's root or another variant counts for less than the term itself
+VARIANT_WEIGHT = 0.5
+
+
+def hebrew_root(term: str) -> str:
+    """Plural and construct suffixes off - טנקים -> טנק, as the old scan matched"""
+    return term.rstrip('ים').rstrip('ות').rstrip('ים')
+
+
+class QueryPlanner:
+    """Conjunction-first evaluation of search terms against an InvertedIndex"""
+
+    def __init__(self, index: InvertedIndex, max_df_ratio: float = 0.4, time_budget: float = 0.05,
+                 max_terms: int = 12, max_candidates: int = 200,
+                 expand: Optional[Callable[[str], Sequence[str]]] = None,
+                 fuzzy: Optional[Callable[[str], Sequence[str]]] = None, fuzzy_min_df: int = 2):
+        self.index = index
+        self.expand = expand  # term -> synonyms and spellings that also count as a match
+        self.fuzzy = fuzzy    # word -> close vocabulary words, tried for rare or unseen terms
+        self.fuzzy_min_df = fuzzy_min_df
+        self.max_df_ratio = max_df_ratio
+        self.time_budget = time_budget
+        self.max_terms = max_terms
+        self.max_candidates = max_candidates
+
+    @classmethod
+    def from_env(cls, index: InvertedIndex, expand: Optional[Callable[[str], Sequence[str]]] = None,
+                 fuzzy: Optional[Callable[[str], Sequence[str]]] = None) -> 'QueryPlanner':
+        return cls(
+            index,
+            max_df_ratio=float(os.environ.get('QUERY_MAX_DF_RATIO', 0.4)),
+            time_budget=float(os.environ.get('QUERY_TIME_BUDGET_MS', 50)) / 1000,
+            max_terms=int(os.environ.get('QUERY_MAX_TERMS', 12)),
+            max_candidates=int(os.environ.get('QUERY_MAX_CANDIDATES', 200)),
+            expand=expand,
+            fuzzy=fuzzy,
+            fuzzy_min_df=int(os.environ.get('FUZZY_MIN_DF', 2)),
+        )
+
+    @property
+    def cache_tag(self) -> str:
+        """Settings that change results - part of any result cache key"""
+        return (f'df{self.max_df_ratio:g}-t{self.max_terms}-c{self.max_candidates}'
+                f'-f{self.fuzzy_min_df if self.fuzzy else 0}')
+
+    def variants(self, term: str) -> Tuple[str, ...]:
+        """The term, its root form and any expansions - an OR group evaluated as one term"""
+        variants = [term]
+        root = hebrew_root(term)
+        if len(root) >= 3 and root != term:
+            variants.append(root)
+        if self.expand is not None:
+            variants += self.expand(term)
+        return tuple(dict.fromkeys(variants))
+
+    def _candidates(self, variants: Sequence[str]) -> Set[int]:
+        doc_ids: Set[int] = set()
+        for variant in variants:
+            doc_ids |= self.index.candidates(variant) or set()
+        return doc_ids
+
+    def plan(self, terms: Sequence[str]) -> QueryPlan:
+        """Estimate each term's selectivity and keep the useful ones, rarest first"""
+        total = max(len(self.index), 1)
+        planned: List[PlannedTerm] = []
+        dropped: List[Tuple[str, str]] = []
+        seen = set()
+        for term in terms:
+            key = term.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            variants = self.variants(term)
+            doc_freq = len(self._candidates(variants))
+            if doc_freq < self.fuzzy_min_df and self.fuzzy is not None and ' ' not in term.strip():
+                # Rare or unseen spelling (מלכויות, חסידוס) - its close vocabulary words join the OR group
+                variants += tuple(v for v in self.fuzzy(term) if v not in variants)
+                doc_freq = len(self._candidates(variants))
+            if doc_freq == 0:
+                dropped.append((term, 'no_match'))
+            else:
+                planned.append(PlannedTerm(term, variants, doc_freq))
+
+        planned.sort(key=lambda t: t.doc_freq)
+        # Near-stopwords match most of the corpus - they only add scan work, never selectivity
+        selective = [t for t in planned if t.doc_freq / total <= self.max_df_ratio]
+        common = [t for t in planned if t.doc_freq / total > self.max_df_ratio]
+        return QueryPlan(selective, common, dropped)
+
+    def matches(self, term: PlannedTerm) -> Dict[int, float]:
+        """Docs that really contain the term (1.0) or only one of its other variants (VARIANT_WEIGHT)"""
+        weights: Dict[int, float] = {}
+        for doc_id in self._candidates(term.variants):
+            if self.index.contains(doc_id, term.text):
+                weights[doc_id] = 1.0
+            elif any(self.index.contains(doc_id, v) for v in term.variants[1:]):
+                weights[doc_id] = VARIANT_WEIGHT
+        return weights
+
+    def execute(self, plan: QueryPlan, min_results: int = 0) -> List[Tuple[int, float]]:
+        """(doc_id, matched terms) - every term (AND) ahead of partial (OR) matches, capped at max_candidates"""
+        start = time.perf_counter()
+        hit_counts: Counter = Counter()
+        matched_terms = 0
+        for term in plan.terms:
+            if matched_terms >= self.max_terms or time.perf_counter() - start > self.time_budget:
+                # Rarest terms are already in - the rest would mostly add weak partial matches
+                plan.timed_out = matched_terms < self.max_terms
+                plan.dropped += [(t.text, 'budget') for t in plan.terms[plan.evaluated:]]
+                break
+            doc_ids = self.matches(term)
+            plan.evaluated += 1
+            if doc_ids:
+                matched_terms += 1
+            hit_counts.update(doc_ids)
+
+        # Too few hits (often phrase windows that never occur) - widen with common terms, rarest first
+        for term in plan.common:
+            if len(hit_counts) >= max(min_results, 1):
+                break
+            hit_counts.update(self.matches(term))
+            plan.evaluated += 1
+
+        ranked = sorted(hit_counts.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:self.max_candidates]
+
+    def search(self, terms: Sequence[str], min_results: int = 0) -> Tuple[List[Tuple[int, float]], QueryPlan]:
+        plan = self.plan(terms)
+        return self.execute(plan, min_results), plan
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Opt-in cProfile capture for single requests
+Triggered by an X-Profile header carrying PROFILE_TOKEN, or by sampling; profiles are kept on disk
+"""
+
+import contextvars
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_RE = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{6}$')
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+# Profiles of worker threads that ran on behalf of the profiled request
+_thread_profiles: contextvars.ContextVar[Optional[List[cProfile.Profile]]] = contextvars.ContextVar(
+    'thread_profiles', default=None)
+
+
+def profiled(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Wrap work handed to a thread pool so it is included in the request's profile"""
+
+    def run():
+        collected = _thread_profiles.get()
+        if collected is None:
+            return fn()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ profiles every thread from one interpreter-wide hook - already covered
+            return fn()
+        try:
+            return fn()
+        finally:
+            profile.disable()
+            collected.append(profile)
+
+    return run
+
+
+class RequestProfiler:
+    """Runs a request under cProfile and stores <id>.prof with <id>.json metadata"""
+
+    def __init__(self, directory: str = 'profiles', sample_rate: float = 0.0, token: str = '',
+                 max_profiles: int = 50):
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.token = token
+        self.max_profiles = max_profiles
+        # cProfile cannot nest across threads on 3.12+, and one profile at a time is plenty
+        self._busy = threading.Lock()
+        self._files_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        return cls(
+            directory=os.environ.get('PROFILE_DIR', 'profiles'),
+            sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+            token=os.environ.get('PROFILE_TOKEN', ''),
+            max_profiles=int(os.environ.get('PROFILE_MAX_FILES', 50)),
+        )
+
+    def authorized(self, supplied: Optional[str]) -> bool:
+        """Header triggers and the profile endpoints are disabled until PROFILE_TOKEN is set"""
+        return bool(self.token) and bool(supplied) and hmac.compare_digest(supplied, self.token)
+
+    def trigger(self, headers) -> Optional[str]:
+        """'header', 'sample' or None for this request"""
+        if self.authorized(headers.get('X-Profile')):
+            return 'header'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def run(self, fn: Callable[[], Any], trigger: str, metadata: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+        """Call fn under the profiler - returns (result, profile_id), id None if another profile was running"""
+        if not self._busy.acquire(blocking=False):
+            return fn(), None
+
+        try:
+            thread_profiles: List[cProfile.Profile] = []
+            token = _thread_profiles.set(thread_profiles)
+            profile = cProfile.Profile()
+            error = None
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                result = fn()
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                profile.disable()
+                elapsed = time.perf_counter() - start
+                _thread_profiles.reset(token)
+                profile_id = self._save(profile, thread_profiles, dict(
+                    metadata, trigger=trigger, duration_ms=round(elapsed * 1000, 1),
+                    error=str(error) if error else None))
+            return result, profile_id
+        finally:
+            self._busy.release()
+
+    def _save(self, profile: cProfile.Profile, thread_profiles: List[cProfile.Profile],
+              metadata: Dict[str, Any]) -> Optional[str]:
+        profile_id = time.strftime('%Y%m%d-%H%M%S') + '-' + secrets.token_hex(3)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            stats = pstats.Stats(profile)
+            for extra in thread_profiles:
+                stats.add(extra)
+            stats.dump_stats(str(self.directory / f'{profile_id}.prof'))
+            metadata = dict(metadata, id=profile_id, created_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                            threads=1 + len(thread_profiles))
+            with open(self.directory / f'{profile_id}.json', 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            self._prune()
+        except OSError as e:
+            logger.error(f"Could not save profile: {e}")
+            return None
+        logger.info(f"Saved profile {profile_id} ({metadata['trigger']}, {metadata['duration_ms']} ms)")
+        return profile_id
+
+    def _prune(self):
+        """Keep only the newest max_profiles"""
+        with self._files_lock:
+            for meta_path in sorted(self.directory.glob('*.json'))[:-self.max_profiles or None]:
+                meta_path.unlink(missing_ok=True)
+                meta_path.with_suffix('.prof').unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first"""
+        profiles = []
+        for meta_path in sorted(self.directory.glob('*.json'), reverse=True):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # pruned or half-written
+        return profiles
+
+    def path(self, profile_id: str) -> Optional[Path]:
+        if not PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        path = self.directory / f'{profile_id}.prof'
+        return path if path.exists() else None
+
+    def as_text(self, profile_id: str, sort: str = 'cumulative', limit: int = 60) -> Optional[str]:
+        """pstats report, for reading a profile without downloading it"""
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        stream = io.StringIO()
+        stats = pstats.Stats(str(path), stream=stream)
+        stats.strip_dirs().sort_stats(sort if sort in SORT_KEYS else 'cumulative').print_stats(limit)
+        return stream.getvalue()
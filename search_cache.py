@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Keyword search result cache
+Ranked chunk ids keyed by extracted terms, filters and corpus version - in-memory LRU over shared SQLite
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# (file_path, chunk_id, term score) - the score lets callers apply query-specific tiebreaks
+RankedIds = List[Tuple[str, Any, float]]
+
+
+def corpus_version(*paths: str) -> str:
+    """Changes whenever a corpus file is replaced or rewritten"""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f'{os.path.abspath(path)}\x1f{stat.st_size}\x1f{stat.st_mtime_ns}\x1e'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def cache_key(terms: Sequence[str], filters: Dict[str, Any], version: str) -> str:
+    encoded = json.dumps([[' '.join(t.split()) for t in terms], filters, version],
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class SearchCache:
+    """Bounded LRU per process; the optional SQLite tier is shared by every worker on the host"""
+
+    def __init__(self, version: str, max_entries: int = 1024, db_path: Optional[str] = None,
+                 db_max_entries: int = 20000):
+        self.version = version
+        self.max_entries = max_entries
+        self.db_max_entries = db_max_entries
+        self._entries: 'OrderedDict[str, RankedIds]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0}
+        self._puts_since_prune = 0
+
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    corpus_version TEXT NOT NULL,
+                    ranked TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_search_cache_created ON search_cache (created_at)')
+            # Entries for any other corpus bundle can never hit again
+            self._conn.execute('DELETE FROM search_cache WHERE corpus_version != ?', (version,))
+            self._conn.commit()
+
+    def key(self, terms: Sequence[str], filters: Dict[str, Any]) -> str:
+        return cache_key(terms, filters, self.version)
+
+    def get(self, key: str) -> Optional[RankedIds]:
+        with self._lock:
+            ranked = self._entries.get(key)
+            if ranked is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return ranked
+
+            if self._conn is not None:
+                row = self._conn.execute('SELECT ranked FROM search_cache WHERE key = ? AND corpus_version = ?',
+                                         (key, self.version)).fetchone()
+                if row is not None:
+                    ranked = [tuple(item) for item in json.loads(row[0])]
+                    self._remember(key, ranked)
+                    self._stats['shared_hits'] += 1
+                    return ranked
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key: str, ranked: RankedIds):
+        with self._lock:
+            self._remember(key, ranked)
+            self._stats['stores'] += 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO search_cache (key, corpus_version, ranked, created_at) VALUES (?, ?, ?, ?)',
+                    (key, self.version, json.dumps(ranked, ensure_ascii=False), time.time()))
+                self._puts_since_prune += 1
+                if self._puts_since_prune >= 100:
+                    self._puts_since_prune = 0
+                    self._conn.execute(
+                        'DELETE FROM search_cache WHERE key IN '
+                        '(SELECT key FROM search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+                        (self.db_max_entries,))
+                self._conn.commit()
+            except sqlite3.OperationalError:
+                pass  # another worker holds the write lock - the local tier still has it
+
+    def _remember(self, key: str, ranked: RankedIds):
+        self._entries[key] = ranked
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Cached catalog of the sefarim under CHABAD_DATA_PATH
+Scans once, keeps book metadata in memory and refreshes incrementally by mtime
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEFER_EXTENSIONS = ('.json', '.txt')
+
+
+@dataclass
+class CatalogEntry:
+    """Book-level metadata for one sefer file"""
+    name: str
+    path: str  # relative to the catalog root
+    size: int
+    mtime: float
+    name_he: str = ''
+    name_en: str = ''
+    author: str = ''
+    chunk_count: Optional[int] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def read_book_metadata(full_path: str) -> Dict:
+    """Titles, author and chunk count of a structured book JSON - empty for anything else"""
+    if not full_path.endswith('.json'):
+        return {}
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, UnicodeDecodeError, OSError) as e:
+        logger.warning(f"Could not read {full_path}: {e}")
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    book_metadata = data.get('book_metadata', {}) or {}
+    chunks = data.get('chunks')
+    return {
+        'name_he': data.get('book_name_he', ''),
+        'name_en': data.get('book_name_en', ''),
+        'author': book_metadata.get('author_he', '') or book_metadata.get('author_en', ''),
+        'chunk_count': len(chunks) if isinstance(chunks, list) else None,
+    }
+
+
+class SefarimCatalog:
+    """In-memory sefarim list that never re-reads an unchanged file"""
+
+    def __init__(self, root: str, refresh_interval: float = 30.0, cache_file: Optional[str] = None):
+        self.root = root
+        self.refresh_interval = refresh_interval
+        self.cache_file = cache_file
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._sorted: List[CatalogEntry] = []
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._refresh_started = False  # a background refresh is queued or running
+        self._load_cache()
+
+    def list(self, offset: int = 0, limit: Optional[int] = None, q: str = '',
+             author: str = '', ext: str = '') -> Tuple[List[CatalogEntry], int]:
+        """Filtered page of the catalog and the number of matching sefarim"""
+        self._ensure_fresh()
+        entries = self._sorted
+
+        if q:
+            q_lower = q.lower()
+            entries = [e for e in entries if q_lower in e.path.lower() or q in e.name_he
+                       or q_lower in e.name_en.lower()]
+        if author:
+            entries = [e for e in entries if author in e.author]
+        if ext:
+            ext = ext if ext.startswith('.') else f'.{ext}'
+            entries = [e for e in entries if e.path.endswith(ext)]
+
+        total = len(entries)
+        end = None if limit is None else offset + limit
+        return entries[offset:end], total
+
+    def refresh(self):
+        """Walk the tree, re-reading only files whose size or mtime changed"""
+        if not self._refreshing.acquire(blocking=False):
+            return  # another thread is already refreshing
+        try:
+            self._scan()
+        finally:
+            self._refreshing.release()
+
+    def _scan(self):
+        """One walk of the tree - the caller holds _refreshing"""
+        start = time.perf_counter()
+        seen = set()
+        reread = 0
+
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in filenames:
+                if not filename.endswith(SEFER_EXTENSIONS):
+                    continue
+                full_path = os.path.join(dirpath, filename)
+                rel_path = os.path.relpath(full_path, self.root)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                seen.add(rel_path)
+
+                existing = self._entries.get(rel_path)
+                if existing and existing.mtime == stat.st_mtime and existing.size == stat.st_size:
+                    continue
+
+                entry = CatalogEntry(name=filename, path=rel_path, size=stat.st_size,
+                                     mtime=stat.st_mtime, **read_book_metadata(full_path))
+                with self._lock:
+                    self._entries[rel_path] = entry
+                reread += 1
+
+        removed = [path for path in self._entries if path not in seen]
+        with self._lock:
+            for path in removed:
+                del self._entries[path]
+            self._sorted = sorted(self._entries.values(), key=lambda e: e.path)
+            self._last_refresh = time.time()
+
+        if reread or removed:
+            logger.info(f"Catalog refreshed: {len(self._entries)} sefarim, {reread} re-read, "
+                        f"{len(removed)} removed ({time.perf_counter() - start:.2f}s)")
+            self._save_cache()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refresh_started = False
+
+    def _ensure_fresh(self):
+        if not self._last_refresh:
+            # Without a saved catalog the first requests wait for the one initial scan; later ones never wait
+            with self._refreshing:
+                if not self._last_refresh:
+                    self._scan()
+        elif time.time() - self._last_refresh > self.refresh_interval:
+            with self._lock:
+                if self._refresh_started:
+                    return  # one refresh at a time - requests keep reading the current list
+                self._refresh_started = True
+            threading.Thread(target=self._background_refresh, name='sefarim-catalog-refresh', daemon=True).start()
+
+    def _load_cache(self):
+        """Start from the metadata saved by a previous process"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('root') != os.path.abspath(self.root):
+                return
+            self._entries = {e['path']: CatalogEntry(**e) for e in cached.get('entries', [])}
+            self._sorted = sorted(self._entries.values(), key=lambda e: e.path)
+            # Served as-is; once it is older than the interval a background refresh catches up
+            self._last_refresh = cached.get('refreshed_at') or os.path.getmtime(self.cache_file)
+        except (json.JSONDecodeError, OSError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable catalog cache {self.cache_file}: {e}")
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        with self._lock:
+            payload = {'root': os.path.abspath(self.root), 'refreshed_at': self._last_refresh,
+                       'entries': [e.to_dict() for e in self._sorted]}
+        tmp_path = f"{self.cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write catalog cache {self.cache_file}: {e}")
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Structure-aware chunking of sefarim for translation
+Splits structured book JSON and plain text on seif/sentence boundaries and serves pages lazily
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from passage_selector import clean_passage_text
+
+# Preferred break points, strongest first: paragraph, sentence end, any whitespace
+PARAGRAPH_BREAK_RE = re.compile(r'\n\s*')
+SENTENCE_BREAK_RE = re.compile(r'(?<=[.:?!])\s+')
+WORD_BREAK_RE = re.compile(r'\s+')
+
+
+def split_spans(text: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """Cover text with (start, end) spans of at most chunk_size chars, cut at natural boundaries"""
+    spans = []
+    start = 0
+    length = len(text)
+    while start < length:
+        # Skip leading whitespace so chunks never start mid-gap
+        while start < length and text[start].isspace():
+            start += 1
+        if start >= length:
+            break
+        limit = start + chunk_size
+        if limit >= length:
+            spans.append((start, length))
+            break
+
+        end = None
+        window = text[start:limit]
+        for pattern in (PARAGRAPH_BREAK_RE, SENTENCE_BREAK_RE, WORD_BREAK_RE):
+            breaks = [m.start() for m in pattern.finditer(window) if m.start() > chunk_size // 3]
+            if breaks:
+                end = start + breaks[-1]
+                break
+        if end is None:
+            end = limit  # one enormous word - hard cut
+        spans.append((start, end))
+        start = end
+    return spans
+
+
+class SeferChunker:
+    """Pages through a sefer's chunks without materializing the whole book per request"""
+
+    def __init__(self, root: str, chunk_size: int = 2000, max_cached_books: int = 8):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_cached_books = max_cached_books
+        # (full_path, mtime) -> layout; books hold parsed JSON for the same key
+        self._layouts: 'OrderedDict[Tuple[str, float], List[Tuple]]' = OrderedDict()
+        self._books: 'OrderedDict[Tuple[str, float], List[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def page(self, rel_path: str, offset: int = 0, limit: int = 10) -> Dict[str, Any]:
+        """Chunks [offset, offset + limit) of a sefer, plus totals for pagination"""
+        full_path = self._resolve(rel_path)
+        if full_path is None:
+            return {'chunks': [], 'total_chunks': 0, 'offset': offset, 'limit': limit, 'has_more': False}
+
+        key = (full_path, os.path.getmtime(full_path))
+        layout = self._layout(key)
+        entries = layout[offset:offset + limit]
+
+        if full_path.endswith('.json'):
+            chunks = self._json_page(key, entries, offset)
+        else:
+            chunks = self._text_page(full_path, entries, offset)
+
+        return {
+            'chunks': chunks,
+            'total_chunks': len(layout),
+            'offset': offset,
+            'limit': limit,
+            'has_more': offset + len(entries) < len(layout),
+        }
+
+    def _resolve(self, rel_path: str):
+        root = os.path.realpath(self.root)
+        full_path = os.path.realpath(os.path.join(root, rel_path))
+        # Never serve files outside the data root
+        if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+            return None
+        return full_path
+
+    def _layout(self, key: Tuple[str, float]) -> List[Tuple]:
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        full_path = key[0]
+        layout = self._json_layout(key) if full_path.endswith('.json') else self._text_layout(full_path)
+
+        with self._lock:
+            self._layouts[key] = layout
+            if len(self._layouts) > self.max_cached_books * 4:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def _book_chunks(self, key: Tuple[str, float]) -> List[Dict[str, Any]]:
+        """Parsed book chunks with cleaned text, cached per file version"""
+        with self._lock:
+            chunks = self._books.get(key)
+            if chunks is not None:
+                self._books.move_to_end(key)
+                return chunks
+
+        with open(key[0], 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        chunks = []
+        if isinstance(data, dict) and isinstance(data.get('chunks'), list):
+            for chunk in data['chunks']:
+                metadata = chunk.get('chunk_metadata', {})
+                chunks.append({
+                    'chunk_id': chunk.get('chunk_id'),
+                    'title': metadata.get('chunk_title', '') or chunk.get('chunk_title', ''),
+                    'text': clean_passage_text(chunk.get('text', '')).strip(),
+                })
+        else:
+            # Not a structured book - translate its pretty-printed JSON as text
+            chunks.append({'chunk_id': None, 'title': '', 'text': json.dumps(data, ensure_ascii=False, indent=1)})
+
+        with self._lock:
+            self._books[key] = chunks
+            if len(self._books) > self.max_cached_books:
+                self._books.popitem(last=False)
+        return chunks
+
+    def _json_layout(self, key: Tuple[str, float]) -> List[Tuple[int, int, int]]:
+        """(book chunk position, start, end) per translatable chunk - seifim are never merged"""
+        layout = []
+        for position, chunk in enumerate(self._book_chunks(key)):
+            for start, end in split_spans(chunk['text'], self.chunk_size):
+                layout.append((position, start, end))
+        return layout
+
+    def _text_layout(self, full_path: str) -> List[Tuple[int, int]]:
+        """(byte start, byte end) per chunk, built in one streaming pass over the file"""
+        layout = []
+        chunk_start = chunk_end = position = 0
+        chunk_chars = 0
+
+        with open(full_path, 'rb') as f:
+            for raw_line in f:
+                line = raw_line.decode('utf-8', errors='replace')
+                line_start = position
+                position += len(raw_line)
+                is_break = not line.strip()
+
+                if chunk_chars and (chunk_chars + len(line) > self.chunk_size or
+                                    (is_break and chunk_chars > self.chunk_size // 2)):
+                    layout.append((chunk_start, chunk_end))
+                    chunk_chars = 0
+
+                if len(line) > self.chunk_size:
+                    # A single huge line - split it on sentence boundaries
+                    encoded_offset = 0
+                    previous = 0
+                    for start, end in split_spans(line, self.chunk_size):
+                        encoded_offset += len(line[previous:start].encode('utf-8'))
+                        piece_bytes = len(line[start:end].encode('utf-8'))
+                        layout.append((line_start + encoded_offset, line_start + encoded_offset + piece_bytes))
+                        encoded_offset += piece_bytes
+                        previous = end
+                    continue
+
+                if not chunk_chars:
+                    if is_break:
+                        continue
+                    chunk_start = line_start
+                chunk_chars += len(line)
+                chunk_end = position
+
+        if chunk_chars:
+            layout.append((chunk_start, chunk_end))
+        return layout
+
+    def _json_page(self, key: Tuple[str, float], entries: List[Tuple[int, int, int]], offset: int) -> List[Dict]:
+        book_chunks = self._book_chunks(key)
+        chunks = []
+        for index, (position, start, end) in enumerate(entries, offset):
+            chunk = book_chunks[position]
+            chunks.append({
+                'index': index,
+                'content': chunk['text'][start:end],
+                'chunk_id': chunk['chunk_id'],
+                'title': chunk['title'],
+                'start_pos': start,
+                'end_pos': end,
+            })
+        return chunks
+
+    def _text_page(self, full_path: str, entries: List[Tuple[int, int]], offset: int) -> List[Dict]:
+        chunks = []
+        with open(full_path, 'rb') as f:
+            for index, (start, end) in enumerate(entries, offset):
+                f.seek(start)
+                content = f.read(end - start).decode('utf-8', errors='replace').strip()
+                chunks.append({
+                    'index': index,
+                    'content': content,
+                    'start_pos': start,
+                    'end_pos': end,
+                })
+        return chunks
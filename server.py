@@ -7,29 +7,46 @@ Provides API endpoints for searching and analyzing Chabad literature
 import os
 import json
 import re
-import subprocess
-import tempfile
 import pickle
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
-from flask import Flask, request, jsonify, send_from_directory
+from typing import TYPE_CHECKING, Callable, List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, replace
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
-import anthropic
 import logging
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
+from hybrid_ranker import HybridRanker, HybridConfig
+from passage_selector import PassageIndex, PassageSelector, estimate_tokens
+from prompt_builder import PromptBuilder
+from single_flight import SingleFlight, fingerprint, normalize_key_text
+from session_store import SessionStore
+from source_cards import SourceCards
+from search_cache import RankedIds, SearchCache, corpus_version
+from text_index import InvertedIndex
+from query_planner import QueryPlanner
+from lexicon import get_lexicon
+from fuzzy_index import FuzzyIndex
+from near_duplicates import NearDuplicates
+from chunk_neighbours import ChunkNeighbours, chunk_ref, KINDS as NEIGHBOUR_KINDS
+from http_compression import HTTPCompression
+from metrics import init_app as init_metrics, metrics, record_error, record_llm_usage, span
+from request_profiler import RequestProfiler, profiled
+
+# Heavy provider modules (anthropic, openai, numpy, sentence_transformers) are
+# imported on first use so keyword-only workers boot without them
+if TYPE_CHECKING:
+    import numpy as np
+    from embedding_providers import EmbeddingProvider
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json.ensure_ascii = False  # Hebrew as UTF-8 is a third the size of \uXXXX escapes
 CORS(app)
-
-# OpenAI client for embeddings
-openai_client = None
+HTTPCompression(app, static_max_age=int(os.environ.get('STATIC_MAX_AGE', 300)))
+init_metrics(app)
 
 @dataclass
 class SearchResult:
@@ -44,55 +61,53 @@ class SearchResult:
     similarity_score: float = 0.0  # For semantic search ranking
 
 class SemanticSearchEngine:
-    """Vector similarity search using OpenAI embeddings"""
+    """Vector similarity search over a pluggable embedding provider"""
 
-    def __init__(self, openai_api_key: str):
-        self.client = OpenAI(api_key=openai_api_key)
+    def __init__(self, provider: 'EmbeddingProvider'):
+        self.provider = provider
         self.embeddings = []
         self.chunks_data = []
-        self.embeddings_file = 'embeddings_cache.pkl'
+        # Keep the original cache name for the default OpenAI model
+        if provider.name == 'openai' and provider.model_name == 'text-embedding-3-large':
+            self.embeddings_file = 'embeddings_cache.pkl'
+        else:
+            self.embeddings_file = f'embeddings_cache_{provider.cache_slug}.pkl'
+
+    def create_embeddings(self, all_chunks: List[SearchResult],
+                          cluster_of: Optional[Callable[[Tuple[str, Any]], Any]] = None):
+        """Create embeddings for all chunks - one-time operation
 
-    def create_embeddings(self, all_chunks: List[SearchResult]):
-        """Create embeddings for all chunks - one-time operation"""
-        logger.info(f"Creating embeddings for {len(all_chunks)} chunks...")
+        With cluster_of, near-duplicate chunks share the vector of their cluster's first chunk.
+        """
+        logger.info(f"Creating embeddings for {len(all_chunks)} chunks with {self.provider.cache_slug}...")
 
         texts_to_embed = []
+        row_of_cluster: Dict[Any, int] = {}
+        rows = []
         for chunk in all_chunks:
-            # Combine title + text for better semantic matching
-            combined_text = f"{chunk.chunk_title}\n{chunk.text[:1000]}"  # First 1000 chars
-            texts_to_embed.append(combined_text)
-
-        # Batch embed (OpenAI allows up to 2048 texts per request)
-        batch_size = 100
-        all_embeddings = []
-
-        for i in range(0, len(texts_to_embed), batch_size):
-            batch = texts_to_embed[i:i + batch_size]
-            logger.info(f"Embedding batch {i//batch_size + 1}/{(len(texts_to_embed) + batch_size - 1)//batch_size}")
-
-            import time
-            if i > 0:
-                time.sleep(15)  # Rate limit protection - wait between batches
-
-            response = self.client.embeddings.create(
-                model="text-embedding-3-large",  # Best quality
-                input=batch
-            )
-
-            batch_embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(batch_embeddings)
-
-        self.embeddings = np.array(all_embeddings)
+            key = (chunk.file_path, chunk.chunk_id)
+            cluster = cluster_of(key) if cluster_of is not None else key
+            if cluster not in row_of_cluster:
+                row_of_cluster[cluster] = len(texts_to_embed)
+                # Combine title + text for better semantic matching
+                combined_text = f"{chunk.chunk_title}\n{chunk.text[:1000]}"  # First 1000 chars
+                texts_to_embed.append(combined_text)
+            rows.append(row_of_cluster[cluster])
+
+        if len(texts_to_embed) < len(all_chunks):
+            logger.info(f"Skipping {len(all_chunks) - len(texts_to_embed)} near-duplicate chunks")
+        self.embeddings = self._normalize(self.provider.embed_documents(texts_to_embed))[rows]
         self.chunks_data = all_chunks
 
         # Cache embeddings to file
         with open(self.embeddings_file, 'wb') as f:
             pickle.dump({
                 'embeddings': self.embeddings,
-                'chunks_data': self.chunks_data
+                'chunks_data': self.chunks_data,
+                'model': self.provider.cache_slug
             }, f)
 
-        logger.info(f"✅ Created and cached {len(all_embeddings)} embeddings")
+        logger.info(f"✅ Created and cached {len(self.embeddings)} embeddings")
 
     def load_embeddings(self):
         """Load cached embeddings if available"""
@@ -100,28 +115,46 @@ class SemanticSearchEngine:
             logger.info("Loading cached embeddings...")
             with open(self.embeddings_file, 'rb') as f:
                 data = pickle.load(f)
-                self.embeddings = data['embeddings']
-                self.chunks_data = data['chunks_data']
+            if data.get('model', self.provider.cache_slug) != self.provider.cache_slug:
+                logger.warning(f"Embeddings cache was built with {data['model']}, rebuilding")
+                return False
+            self.embeddings = self._normalize(data['embeddings'])
+            self.chunks_data = data['chunks_data']
             logger.info(f"✅ Loaded {len(self.chunks_data)} cached embeddings")
             return True
         return False
 
+    @staticmethod
+    def _normalize(embeddings) -> 'np.ndarray':
+        """Unit-normalize rows once so query scoring is a single dot product"""
+        import numpy as np
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.where(norms == 0, 1, norms)
+
+    def sentence_similarity(self, query: str, sentences: List[str]) -> List[float]:
+        """Cosine similarity of each sentence to the query, for passage selection"""
+        import numpy as np
+
+        sentence_embeddings = self._normalize(self.provider.embed_documents(sentences))
+        query_embedding = self.provider.embed_query(query)
+        return list(np.dot(sentence_embeddings, query_embedding) / (np.linalg.norm(query_embedding) or 1.0))
+
     def semantic_search(self, query: str, top_k: int = 15, min_score: float = 0.25) -> List[SearchResult]:
         """Find most similar chunks using vector similarity with quality threshold"""
-        # Embed the query
-        response = self.client.embeddings.create(
-            model="text-embedding-3-large",  # Match the model used for chunks
-            input=[query]
-        )
-        query_embedding = np.array(response.data[0].embedding)
+        import numpy as np
 
-        # Calculate cosine similarity
-        similarities = np.dot(self.embeddings, query_embedding) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_embedding)
-        )
+        # Embed the query with the same provider used for the chunks
+        with span('embed_query'):
+            query_embedding = self.provider.embed_query(query)
+
+        with span('vector_score'):
+            # Cosine similarity - chunk rows are already normalized
+            similarities = np.dot(self.embeddings, query_embedding) / (np.linalg.norm(query_embedding) or 1.0)
 
-        # Get all results above threshold, sorted by similarity
-        all_indices = np.argsort(similarities)[::-1]
+            # Get all results above threshold, sorted by similarity
+            all_indices = np.argsort(similarities)[::-1]
 
         # Filter by minimum score and limit to top_k
         results = []
@@ -130,9 +163,8 @@ class SemanticSearchEngine:
             if score < min_score:
                 break  # Stop when scores get too low
 
-            chunk = self.chunks_data[idx]
-            chunk.similarity_score = score
-            results.append(chunk)
+            # Copy so per-request scores never leak into the cached chunks
+            results.append(replace(self.chunks_data[idx], similarity_score=score))
 
             if len(results) >= top_k:
                 break
@@ -152,51 +184,8 @@ class ChabadSearchService:
         self.sichos_file = Path(sichos_file)
         self.maamarim_file = Path(maamarim_file)
 
-        # Common question words to strip from searches
-        self.question_words = [
-            'מה', 'מהו', 'מהי', 'איך', 'למה', 'מדוע', 'כיצד', 'מתי',
-            'what', 'how', 'why', 'when', 'where', 'explain', 'tell', 'is', 'are', 'and', 'the', 'a', 'an',
-            'זה', 'זו', 'את', 'הסבר', 'תסביר', 'ביאור', 'של', 'ו', 'ה'
-        ]
-
-        # Common transliterations and translations
-        self.term_translations = {
-            # Tanks and campaigns
-            'tank': 'טנק',
-            'tanks': 'טנקים',
-            'mitzvah tank': 'טנק מצוה',
-            'mitzvah tanks': 'טנקי מצוות',
-            'mivtza': 'מבצע',
-            'mivtzaim': 'מבצעים',
-            'campaign': 'מבצע',
-            'campaigns': 'מבצעים',
-
-            # Malchus
-            'malchus': 'מלכות',
-            'malchut': 'מלכות',
-            'malchuts': 'מלכות',
-
-            # Mihu Yehudi
-            'mihu': 'מיהו',
-            'yehudi': 'יהודי',
-            'jew': 'יהודי',
-            'jewish': 'יהודי',
-
-            # Common terms
-            'shabbat': 'שבת',
-            'shabbos': 'שבת',
-            'chanukah': 'חנוכה',
-            'hanukkah': 'חנוכה',
-            'chanuka': 'חנוכה',
-            'rebbe': 'רבי',
-            'rabbi': 'רב',
-            'chassidus': 'חסידות',
-            'chassidut': 'חסידות',
-            'hasidus': 'חסידות',
-            'torah': 'תורה',
-            'teshuvah': 'תשובה',
-            'teshuva': 'תשובה',
-        }
+        # Stopwords, transliterations, synonyms and ר״ת expansions (lexicon.json)
+        self.lexicon = get_lexicon()
 
         if not self.sichos_file.exists():
             raise ValueError(f"Sichos file not found: {sichos_file}")
@@ -204,17 +193,51 @@ class ChabadSearchService:
             raise ValueError(f"Maamarim file not found: {maamarim_file}")
 
         # Load both files into memory for faster searching
-        logger.info("Loading sichos data...")
-        with open(self.sichos_file, 'r', encoding='utf-8') as f:
-            self.sichos_data = json.load(f)
+        with span('load_json'):
+            logger.info("Loading sichos data...")
+            with open(self.sichos_file, 'r', encoding='utf-8') as f:
+                self.sichos_data = json.load(f)
 
-        logger.info("Loading maamarim data...")
-        with open(self.maamarim_file, 'r', encoding='utf-8') as f:
-            self.maamarim_data = json.load(f)
+            logger.info("Loading maamarim data...")
+            with open(self.maamarim_file, 'r', encoding='utf-8') as f:
+                self.maamarim_data = json.load(f)
 
         logger.info(f"Loaded {len(self.sichos_data.get('chunks', []))} sichos chunks")
         logger.info(f"Loaded {len(self.maamarim_data.get('chunks', []))} maamarim chunks")
 
+        # Split every chunk into sentences, index its words and render its source card once, not per query
+        self.passage_index = PassageIndex()
+        self.source_cards = SourceCards()
+        self.text_index = InvertedIndex()
+        self.chunks_by_key: Dict[Tuple[str, Any], SearchResult] = {}
+        # The same maamar in two collections, a sicha quoted at length - one cluster id for all copies
+        self.near_duplicates = NearDuplicates.from_env()
+        for chunk in self.get_all_chunks():
+            self.passage_index.add((chunk.file_path, chunk.chunk_id), chunk.text)
+            self.source_cards.add(chunk)
+            self.text_index.add(chunk.file_path, chunk.work, chunk.chunk_id, chunk.chunk_title, chunk.text)
+            self.chunks_by_key[(chunk.file_path, chunk.chunk_id)] = chunk
+            self.near_duplicates.add((chunk.file_path, chunk.chunk_id), chunk.text)
+        # Typo tolerance over the corpus vocabulary - digits are footnote numbers glued to words
+        self.fuzzy_index = FuzzyIndex(
+            (w for w in self.text_index.postings if not any(c.isdigit() for c in w)),
+            frequencies={w: len(doc_ids) for w, doc_ids in self.text_index.postings.items()})
+
+        # Lexicon synonyms and spellings of a term, and close spellings of rare terms, are matched alongside it
+        self.query_planner = QueryPlanner.from_env(self.text_index, expand=self.lexicon.expansions,
+                                                   fuzzy=self.fuzzy_index.variants)
+        logger.info(f"Indexed passages, terms and source cards for {len(self.passage_index)} chunks "
+                    f"({len(self.text_index.postings)} terms, near-duplicates {self.near_duplicates.stats()})")
+
+        # Keyword results and neighbour tables belong to one corpus version - replacing either file invalidates them
+        self.corpus_version = corpus_version(str(self.sichos_file), str(self.maamarim_file))
+        cache_size = int(os.environ.get('SEARCH_CACHE_SIZE', 1024))
+        self.search_cache = SearchCache(
+            self.corpus_version,
+            max_entries=cache_size,
+            db_path=os.environ.get('SEARCH_CACHE_DB', 'search_cache.sqlite3') or None
+        ) if cache_size > 0 else None
+
     def get_all_chunks(self) -> List[SearchResult]:
         """Get all chunks as SearchResult objects for embedding"""
         all_results = []
@@ -254,66 +277,6 @@ class ChabadSearchService:
 
         return results
 
-    def search_in_chunks(self, search_term: str) -> List[SearchResult]:
-        """Search for term in all chunks from both files"""
-        results = []
-
-        # Search in sichos
-        sichos_results = self._search_in_data(
-            self.sichos_data,
-            search_term,
-            'sichos',
-            str(self.sichos_file)
-        )
-        results.extend(sichos_results)
-
-        # Search in maamarim
-        maamarim_results = self._search_in_data(
-            self.maamarim_data,
-            search_term,
-            'maamarim',
-            str(self.maamarim_file)
-        )
-        results.extend(maamarim_results)
-
-        logger.info(f"Found {len(results)} matching chunks for '{search_term}'")
-        return results
-
-    def _search_in_data(self, data: Dict, search_term: str, source_type: str, file_path: str) -> List[SearchResult]:
-        """Search for term in chunks from a single file"""
-        results = []
-        book_name = data.get('book_name_he', '') or data.get('book_name_en', '')
-        author = data.get('book_metadata', {}).get('author_he', '') or data.get('book_metadata', {}).get('author_en', '')
-
-        chunks = data.get('chunks', [])
-        search_lower = search_term.lower()
-
-        # For Hebrew, also search for root form
-        # e.g., טנקים → also search for טנק
-        root_term = search_term.rstrip('ים').rstrip('ות').rstrip('ים')  # Remove common Hebrew suffixes
-
-        for chunk in chunks:
-            text = chunk.get('text', '')
-            # Case-insensitive search that works with Hebrew/English/Yiddish
-            # Also match root forms for Hebrew words
-            if (search_lower in text.lower() or
-                search_term in text or
-                (len(root_term) >= 3 and root_term in text)):
-
-                result = SearchResult(
-                    file_path=file_path,
-                    chunk_id=chunk.get('chunk_id', ''),
-                    chunk_title=chunk.get('chunk_metadata', {}).get('chunk_title', ''),
-                    discourse_title=self._extract_discourse_title(chunk),
-                    text=text,
-                    author=author,
-                    work=book_name,
-                    metadata=chunk.get('chunk_metadata', {})
-                )
-                results.append(result)
-
-        return results
-
     def _extract_discourse_title(self, chunk: Dict) -> str:
         """Extract the discourse title (ד״ה) from chunk metadata"""
         metadata = chunk.get('chunk_metadata', {})
@@ -341,17 +304,11 @@ class ChabadSearchService:
         # Split into words
         words = query.split()
 
-        # Translate English/transliterated words to Hebrew
-        translated_words = []
-        for word in words:
-            word_lower = word.lower()
-            if word_lower in self.term_translations:
-                translated_words.append(self.term_translations[word_lower])
-            else:
-                translated_words.append(word)
+        # Transliterations and abbreviations become one Hebrew term each - multi-word keys included
+        segments = self.lexicon.segment(words)
 
         # Remove common question words
-        key_words = [w for w in translated_words if w.lower() not in self.question_words]
+        key_words = [seg.text for seg in segments if seg.entry is not None or not self.lexicon.is_stopword(seg.text)]
 
         # Return both the cleaned query and individual key terms
         cleaned_query = ' '.join(key_words)
@@ -368,8 +325,8 @@ class ChabadSearchService:
                     if phrase and phrase not in search_terms:
                         search_terms.append(phrase)
 
-        # Add individual significant words (3+ chars)
-        for word in key_words:
+        # Add individual significant words (3+ chars), including those of multi-word lexicon terms
+        for word in (w for key_word in key_words for w in key_word.split()):
             if len(word) >= 3 and word not in search_terms:
                 search_terms.append(word)
 
@@ -380,35 +337,51 @@ class ChabadSearchService:
         logger.info(f"Original query: {search_term}")
 
         # Extract search terms
-        search_terms = self.extract_search_terms(search_term)
+        with span('extract_terms'):
+            search_terms = self.extract_search_terms(search_term)
         logger.info(f"Extracted search terms: {search_terms}")
 
-        # Search with each term and combine results
-        all_results = []
-        seen_chunks = set()
-
-        for term in search_terms:
-            results = self.search_in_chunks(term)
-            for result in results:
-                chunk_key = (result.file_path, result.chunk_id)
-                if chunk_key not in seen_chunks:
-                    all_results.append(result)
-                    seen_chunks.add(chunk_key)
-
-            # If we found enough results with the first term, stop
-            if len(all_results) >= max_results:
-                break
+        # The scan and term ranking depend only on the terms, so repeats and follow-ups skip them
+        cache_key = None
+        ranked = None
+        if self.search_cache is not None:
+            cache_key = self.search_cache.key(search_terms, {'max_results': max_results,
+                                                             'planner': self.query_planner.cache_tag,
+                                                             'lexicon': self.lexicon.version})
+            ranked = self.search_cache.get(cache_key)
+        if ranked is None:
+            ranked, complete = self._rank_by_terms(search_terms, max_results)
+            # A plan cut short by the time budget is not the answer to cache
+            if cache_key is not None and complete:
+                self.search_cache.put(cache_key, ranked)
+        else:
+            logger.info(f"Keyword cache hit: {len(ranked)} ranked chunks")
 
-        logger.info(f"Found {len(all_results)} total matching chunks")
+        # Exact query match sits between term count and length - the stable sort keeps the length order
+        with span('rank'):
+            ranked = sorted(ranked, key=lambda item: (
+                -item[2], -(search_term in self.chunks_by_key[(item[0], item[1])].text)))
+            # One copy of repeated text - the rest would crowd out other sources
+            ranked = self.near_duplicates.collapse(ranked, key=lambda item: (item[0], item[1]))
 
-        # Sort by relevance - prioritize matches with more search terms
-        def relevance_score(result: SearchResult) -> Tuple[int, int, int]:
-            # Count how many search terms appear in the text
-            term_count = sum(1 for term in search_terms if term in result.text)
+        return [self.chunks_by_key[(file_path, chunk_id)] for file_path, chunk_id, _ in ranked[:max_results]]
 
-            # Check for exact query match
-            exact_match = 1 if search_term in result.text else 0
+    def _rank_by_terms(self, search_terms: List[str], max_results: int) -> Tuple[RankedIds, bool]:
+        """Plan and evaluate the terms over the index, then rank the matches
 
+        Returns ((file_path, chunk_id, term score) list, whether the plan ran to completion).
+        """
+        # Selective terms only, rarest first, chunks matching the most terms ahead of the rest
+        with span('keyword_lookup'):
+            matches, plan = self.query_planner.search(search_terms, max_results)
+        documents = self.text_index.documents
+        all_results = [(self.chunks_by_key[(documents[i].path, documents[i].chunk_id)], term_score)
+                       for i, term_score in matches]
+
+        logger.info(f"Found {len(all_results)} candidate chunks - plan {plan.describe()}")
+
+        # Sort by relevance - prioritize matches with more search terms
+        def relevance_score(result: SearchResult, term_score: float) -> Tuple[float, int]:
             # Prefer texts between 500-2000 chars (focused but complete)
             text_len = len(result.text)
             if 500 <= text_len <= 2000:
@@ -416,37 +389,16 @@ class ChabadSearchService:
             else:
                 length_score = -abs(text_len - 1000)
 
-            return (-term_count, -exact_match, length_score)
-
-        all_results.sort(key=relevance_score)
-
-        return all_results[:max_results]
+            return (-term_score, length_score)
 
-class ChabadAnalyzer:
-    def __init__(self, anthropic_api_key: str):
-        self.client = anthropic.Anthropic(api_key=anthropic_api_key)
-
-    def analyze_search_results(self, search_term: str, results: List[SearchResult],
-                             context: str = '', conversation_history: List[Dict] = None) -> str:
-        """Use Claude to analyze search results with conversation context"""
+        with span('rank'):
+            scored = sorted(((relevance_score(r, term_score), r) for r, term_score in all_results), key=lambda pair: pair[0])
 
-        # Use only top 3 for speed
-        top_results = results[:3]
-
-        # Prepare EXCERPTS for Claude analysis (not full text to save time)
-        results_text = self._format_excerpts_for_analysis(top_results)
-
-        # Detect if query is in Hebrew, Yiddish, or English
-        language_instruction = ""
-        if context and 'english' in context.lower():
-            language_instruction = "Please respond primarily in English."
-        elif any(ord(c) >= 0x0590 and ord(c) <= 0x05FF for c in search_term):
-            language_instruction = "נא להשיב בעברית בעיקר, עם הסברים גם באידיש ובאנגלית כשמתאים."
-        else:
-            language_instruction = "Please respond with explanations in Hebrew, Yiddish (where relevant), and English."
+        return [(r.file_path, r.chunk_id, -score[0]) for score, r in scored], not plan.timed_out
 
-        # Build system prompt
-        system_prompt = """אתה חברותא AI מומחה בחסידות חב"ד, במיוחד בשיחות ומאמרים של הרבי מתשל"ה.
+# Static system prompt - identical on every call; at ~400 tokens it is only cached together with history
+# (PromptBuilder marks a breakpoint once the prefix reaches the 1024-token caching minimum)
+ANALYZER_SYSTEM_PROMPT = """אתה חברותא AI מומחה בחסידות חב"ד, במיוחד בשיחות ומאמרים של הרבי מתשל"ה.
 
 אתה יכול:
 - לענות על שאלות ישירות על מושגים חסידיים
@@ -464,12 +416,36 @@ class ChabadAnalyzer:
 - השתמש ב-HTML עם dir="rtl" וכותרות <h3>
 - אל תכלול את הטקסט המלא של המקורות - הם מתווספים אחרי"""
 
-        # Build messages for conversation
-        messages = []
+class ChabadAnalyzer:
+    def __init__(self, anthropic_api_key: str, passage_selector: Optional[PassageSelector] = None,
+                 passage_token_budget: int = 1500, max_input_tokens: int = 6000):
+        import anthropic
+
+        self.client = anthropic.Anthropic(api_key=anthropic_api_key)
+        self.passage_selector = passage_selector or PassageSelector(PassageIndex())
+        self.passage_token_budget = passage_token_budget  # shared by all sources in a prompt
+        self.prompt_builder = PromptBuilder(ANALYZER_SYSTEM_PROMPT, max_input_tokens=max_input_tokens)
 
-        # Add conversation history if exists
-        if conversation_history:
-            messages.extend(conversation_history[-6:])  # Last 3 exchanges
+    def analyze_search_results(self, search_term: str, results: List[SearchResult],
+                             context: str = '', conversation_history: List[Dict] = None,
+                             search_terms: Optional[List[str]] = None) -> str:
+        """Use Claude to analyze search results with conversation context"""
+
+        # Use only top 3 for speed
+        top_results = results[:3]
+
+        # Prepare the most relevant PASSAGES for Claude analysis (not full text to save time)
+        with span('select_passages'):
+            results_text = self._format_excerpts_for_analysis(top_results, search_terms or search_term.split(), search_term)
+
+        # Detect if query is in Hebrew, Yiddish, or English
+        language_instruction = ""
+        if context and 'english' in context.lower():
+            language_instruction = "Please respond primarily in English."
+        elif any(ord(c) >= 0x0590 and ord(c) <= 0x05FF for c in search_term):
+            language_instruction = "נא להשיב בעברית בעיקר, עם הסברים גם באידיש ובאנגלית כשמתאים."
+        else:
+            language_instruction = "Please respond with explanations in Hebrew, Yiddish (where relevant), and English."
 
         # Detect follow-up/conversational queries (not new topic searches)
         followup_phrases = ['more', 'another', 'else', 'עוד', 'נוסף', 'אחר', 'גם', 'also', 'too']
@@ -496,82 +472,52 @@ class ChabadAnalyzer:
 - דוגמאות והמחשות
 - למעשה בעבודת ה'"""
 
-        messages.append({"role": "user", "content": user_message})
+        # History and sources are trimmed to the input budget; system prompt and history are cached once long enough
+        with span('build_prompt'):
+            prompt = self.prompt_builder.build(user_message, conversation_history)
+        logger.info(f"Prompt: ~{prompt['estimated_tokens']} tokens, {len(prompt['messages']) - 1} history turns")
 
         try:
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20240620",
-                max_tokens=3072,  # Increased for deeper analysis
-                system=system_prompt,
-                messages=messages
-            )
+            with span('llm_call'):
+                response = self.client.messages.create(
+                    model="claude-3-5-sonnet-20240620",
+                    max_tokens=3072,  # Increased for deeper analysis
+                    system=prompt['system'],
+                    messages=prompt['messages']
+                )
+            usage = getattr(response, 'usage', None)
+            record_llm_usage(usage)
+            if usage is not None:
+                logger.info(f"Claude usage: input={usage.input_tokens}, output={usage.output_tokens}, "
+                            f"cache_read={getattr(usage, 'cache_read_input_tokens', 0)}")
             return response.content[0].text
         except Exception as e:
+            record_error('llm_call')
             logger.error(f"Claude API error: {e}")
             raise
 
-    def _format_results_for_analysis(self, results: List[SearchResult]) -> str:
-        """Format search results for Claude analysis - FULL CHUNKS"""
-        formatted = []
-
-        # Limit to top 3 most relevant results for faster processing
-        top_results = results[:3]
-
-        for i, result in enumerate(top_results, 1):
-            # Include metadata for context
-            metadata = result.metadata
-            source_type = metadata.get('type', '')  # שיחה or מאמר
-            seif = metadata.get('seif', metadata.get('perek', ''))
-
-            # Get additional context
-            farbrengen = metadata.get('farbrengen', '')
-            sicha = metadata.get('sicha', '')
-            maamar_type = metadata.get('maamar_type', '')
-
-            formatted.append(f"""
-{'='*80}
-מקור {i} מתוך {len(top_results)}
-{'='*80}
-
-סוג: {source_type}
-מחבר: {result.author}
-ספר: {result.work}
-כותרת מלאה: {result.chunk_title}
-{f'פרבענגען: {farbrengen}' if farbrengen else ''}
-{f'שיחה: {sicha}' if sicha else ''}
-{f'סוג מאמר: {maamar_type}' if maamar_type else ''}
-סעיף/פרק: {seif}
-
---- טקסט מלא של הקטע ---
-
-{result.text}
-
-{'='*80}
-
-""")
-
-        summary = f"\nסה״כ נמצאו {len(results)} מקורות. מוצגים {len(top_results)} המקורות הרלוונטיים ביותר עם הטקסט המלא של כל קטע.\n\n"
-
-        return summary + '\n'.join(formatted)
-
-    def _format_excerpts_for_analysis(self, results: List[SearchResult]) -> str:
-        """Format EXCERPTS for fast Claude analysis"""
+    def _format_excerpts_for_analysis(self, results: List[SearchResult], search_terms: List[str],
+                                      query: str = '') -> str:
+        """Format the best-matching PASSAGES of each source for fast Claude analysis"""
         formatted = []
+        remaining_budget = self.passage_token_budget
 
         for i, result in enumerate(results, 1):
             metadata = result.metadata
             source_type = metadata.get('type', '')
             seif = metadata.get('seif', metadata.get('perek', ''))
 
-            # Use first 800 chars for analysis
-            excerpt = result.text[:800]
+            # Split what is left of the budget evenly; unused tokens roll over to later sources
+            source_budget = remaining_budget // (len(results) - i + 1)
+            excerpt = self.passage_selector.format_excerpt(result, search_terms, source_budget, query)
+            remaining_budget -= estimate_tokens(excerpt)
 
             formatted.append(f"""
 מקור {i}:
 סוג: {source_type} | סעיף: {seif}
 כותרת: {result.chunk_title}
 
-קטע: {excerpt}...
+קטע: {excerpt}
 
 ---
 """)
@@ -582,31 +528,37 @@ class ChabadAnalyzer:
 search_service = None
 analyzer = None
 semantic_engine = None
+semantic_checked = False
+chunk_neighbours = None
+neighbours_checked = False
+hybrid_ranker = HybridRanker(HybridConfig.from_env())
+search_flight = SingleFlight()
+session_store = SessionStore(
+    max_sessions=int(os.environ.get('SESSION_MAX_SESSIONS', 1000)),
+    max_turns=int(os.environ.get('SESSION_MAX_TURNS', 6)),
+    ttl_seconds=float(os.environ.get('SESSION_TTL_SECONDS', 3600))
+)
+_services_lock = threading.Lock()
+request_profiler = RequestProfiler.from_env()
+
+# Scrape-time gauges for the in-process caches
+metrics.register_collector('search_coalescing', search_flight.stats)
+metrics.register_collector('sessions', session_store.stats)
+metrics.register_collector('search_cache', lambda: search_service.search_cache.stats()
+                           if search_service is not None and search_service.search_cache is not None else {})
+metrics.register_collector('near_duplicates', lambda: search_service.near_duplicates.stats()
+                           if search_service is not None else {})
 
 @app.route('/')
 def serve_index():
     """Serve the main HTML page"""
     return send_from_directory('.', 'index.html')
 
-@app.route('/api/search', methods=['POST'])
-def api_search():
-    """Main search endpoint"""
-    try:
-        data = request.get_json()
-        search_term = data.get('search_term', '').strip()
-        context = data.get('context', '').strip()
-        max_results = int(data.get('max_results', 15))
-        conversation_history = data.get('conversation_history', [])
-
-        # Get API key from environment variable or request
-        anthropic_api_key = os.environ.get('ANTHROPIC_API_KEY', data.get('anthropic_api_key', '')).strip()
-
-        if not search_term:
-            return jsonify({'error': 'Search term is required'}), 400
-
-        # Initialize services
-        global search_service, analyzer, semantic_engine, openai_client
+def _ensure_services():
+    """Create the search service and semantic engine on first use - once, even under concurrency"""
+    global search_service, semantic_engine, semantic_checked, chunk_neighbours, neighbours_checked
 
+    with _services_lock:
         # Check for environment variables first (Railway), then fallback to repo data, then local
         sichos_file = os.environ.get('SICHOS_FILE',
             'data/sichos.json' if Path('data/sichos.json').exists()
@@ -621,176 +573,249 @@ def api_search():
             logger.info(f"Maamarim file: {maamarim_file}")
             search_service = ChabadSearchService(sichos_file, maamarim_file)
 
-        # Initialize semantic search if we have OpenAI key
-        openai_api_key = os.environ.get('OPENAI_API_KEY', '')
-        if semantic_engine is None and openai_api_key and openai_api_key.startswith('sk-proj-'):
-            logger.info("Initializing semantic search engine...")
-            semantic_engine = SemanticSearchEngine(openai_api_key)
-
-            # Try to load cached embeddings
-            if not semantic_engine.load_embeddings():
-                # Create embeddings (first time only)
-                logger.info("Creating embeddings for first time - this will take ~2 minutes...")
-                all_chunks = search_service.get_all_chunks()
-                semantic_engine.create_embeddings(all_chunks)
-
-        # HYBRID SEARCH: Combine semantic + keyword for best results
-        if semantic_engine:
-            logger.info(f"🔍 Using hybrid search (semantic + keyword) for: {search_term}")
-
-            # Get semantic results
-            semantic_results = semantic_engine.semantic_search(search_term, max_results)
-            logger.info(f"Semantic: {len(semantic_results)} results")
-
-            # Get keyword results
-            keyword_results = search_service.search_concept(search_term, context, max_results)
-            logger.info(f"Keyword: {len(keyword_results)} results")
-
-            # Combine and deduplicate
-            results_dict = {}
-            for result in semantic_results:
-                key = (result.file_path, result.chunk_id)
-                results_dict[key] = result
-
-            # Add keyword results, boosting their scores
-            for result in keyword_results:
-                key = (result.file_path, result.chunk_id)
-                if key in results_dict:
-                    # Boost score if found in both
-                    results_dict[key].similarity_score += 0.5
-                else:
-                    # Add with decent score
-                    result.similarity_score = 0.4
-                    results_dict[key] = result
-
-            # Sort by similarity score descending
-            all_combined = sorted(results_dict.values(), key=lambda x: x.similarity_score, reverse=True)
-
-            # Filter: only keep results with good scores (>0.35) OR keyword matches (>0.35)
-            results = [r for r in all_combined if r.similarity_score > 0.35][:max_results]
-
-            # If we have very few results, lower threshold slightly
-            if len(results) < 3:
-                results = [r for r in all_combined if r.similarity_score > 0.25][:max_results]
-
-            logger.info(f"Combined: {len(results)} high-quality results (threshold: 0.35, scores: {[f'{r.similarity_score:.2f}' for r in results[:3]]})")
-        else:
-            # Fallback to keyword only
-            logger.info(f"🔤 Using keyword search for: {search_term}")
-            results = search_service.search_concept(search_term, context, max_results)
-            logger.info(f"Found {len(results)} results via keyword search")
-
-        # Handle conversational queries even without new results
-        is_conversational = any(phrase in search_term.lower() for phrase in ['more', 'another', 'else', 'עוד', 'נוסף', 'אחר', 'גם', 'also', 'too', '?'])
-        has_context = conversation_history and len(conversation_history) > 0
-
-        if not results and not (is_conversational and has_context):
-            no_results_msg = f'<div dir="rtl" style="padding: 20px;"><h3>לא נמצאו תוצאות</h3><p>לא נמצאו תוצאות עבור "<strong>{search_term}</strong>" בסיכות ומאמרים של תשל״ה.</p><p>נסה חיפוש אחר או בדוק את האיות.</p></div>'
-            return jsonify({
-                'success': True,
-                'analysis': no_results_msg,
-                'result_count': 0
-            })
-
-        # Check if we have a valid API key for AI analysis
-        if not anthropic_api_key or anthropic_api_key == 'demo_key':
-            # Demo mode - show raw results without AI analysis
-            demo_analysis = f'<div dir="rtl" style="padding: 20px;"><h3>נמצאו {len(results)} תוצאות עבור "{search_term}"</h3>'
-            demo_analysis += '<p style="color: #666; margin: 15px 0;"><em>מציג תוצאות ללא ניתוח AI (נדרש מפתח API)</em></p>'
-
-            for i, result in enumerate(results[:5], 1):
-                metadata = result.metadata
-                source_type = metadata.get('type', '')
-                seif = metadata.get('seif', metadata.get('perek', ''))
-
-                demo_analysis += f'''
-                <div style="margin: 20px 0; padding: 20px; border-right: 4px solid #C79A51; background: #f9f9f9; border-radius: 8px;">
-                    <h4 style="color: #C79A51; margin-bottom: 10px;">{source_type} - סעיף {seif}</h4>
-                    <p style="margin: 5px 0;"><strong>מקור:</strong> {result.author} - {result.work}</p>
-                    <p style="margin: 5px 0;"><strong>כותרת:</strong> {result.chunk_title}</p>
-                    <hr style="margin: 15px 0; border: none; border-top: 1px solid #ddd;">
-                    <p style="margin-top: 15px; line-height: 1.8; font-family: 'Times New Roman', serif;">{result.text[:800]}{'...' if len(result.text) > 800 else ''}</p>
-                </div>
-                '''
-
-            if len(results) > 5:
-                demo_analysis += f'<p style="color: #888; text-align: center; margin-top: 20px;"><em>ועוד {len(results) - 5} תוצאות נוספות...</em></p>'
-
-            demo_analysis += '</div>'
-
-            return jsonify({
+        # Initialize semantic search if an embedding provider is configured
+        if semantic_engine is None and not semantic_checked:
+            semantic_checked = True
+            from embedding_providers import get_embedding_provider
+            provider = get_embedding_provider(os.environ.get('OPENAI_API_KEY', ''))
+            if provider is not None:
+                logger.info(f"Initializing semantic search engine ({provider.cache_slug})...")
+                semantic_engine = SemanticSearchEngine(provider)
+
+                # Try to load cached embeddings
+                if not semantic_engine.load_embeddings():
+                    # Create embeddings (first time only)
+                    logger.info("Creating embeddings for first time - this may take a few minutes...")
+                    all_chunks = search_service.get_all_chunks()
+                    semantic_engine.create_embeddings(all_chunks, search_service.near_duplicates.cluster_of)
+
+        # "More like this" table written by chunk_neighbours.py - optional, /api/related needs it
+        if chunk_neighbours is None and not neighbours_checked:
+            neighbours_checked = True
+            chunk_neighbours = ChunkNeighbours.load(
+                os.environ.get('CHUNK_NEIGHBOURS_FILE', 'chunk_neighbours.json'),
+                {chunk_ref(*key): chunk for key, chunk in search_service.chunks_by_key.items()},
+                search_service.corpus_version)
+
+def _run_search(search_term, context, max_results, conversation_history, anthropic_api_key,
+                response_format='html'):
+    """Retrieve, analyze and render one search - returns (payload, status)"""
+    global analyzer
+
+    # HYBRID SEARCH: Combine semantic + keyword for best results
+    if semantic_engine:
+        logger.info(f"🔍 Using hybrid search (semantic + keyword) for: {search_term}")
+
+        # Run both retrievals in parallel and fuse them by rank
+        hits = hybrid_ranker.search(
+            profiled(lambda: search_service.search_concept(search_term, context, max_results)),
+            profiled(lambda: semantic_engine.semantic_search(search_term, max_results)),
+            max_results,
+            search_service.near_duplicates.cluster_of
+        )
+        results = [hit.as_result() for hit in hits]
+
+        logger.info(f"Combined: {len(results)} results ({hybrid_ranker.config.method}, scores: {[f'{r.similarity_score:.4f}' for r in results[:3]]})")
+    else:
+        # Fallback to keyword only
+        logger.info(f"🔤 Using keyword search for: {search_term}")
+        results = search_service.search_concept(search_term, context, max_results)
+        logger.info(f"Found {len(results)} results via keyword search")
+
+    # Handle conversational queries even without new results
+    is_conversational = any(phrase in search_term.lower() for phrase in ['more', 'another', 'else', 'עוד', 'נוסף', 'אחר', 'גם', 'also', 'too', '?'])
+    has_context = conversation_history and len(conversation_history) > 0
+
+    if not results and not (is_conversational and has_context):
+        no_results_msg = f'<div dir="rtl" style="padding: 20px;"><h3>לא נמצאו תוצאות</h3><p>לא נמצאו תוצאות עבור "<strong>{search_term}</strong>" בסיכות ומאמרים של תשל״ה.</p><p>נסה חיפוש אחר או בדוק את האיות.</p></div>'
+        return {
+            'success': True,
+            'analysis': no_results_msg,
+            'result_count': 0
+        }, 200
+
+    source_cards = search_service.source_cards
+    json_only = response_format == 'json'
+
+    # Check if we have a valid API key for AI analysis
+    if not anthropic_api_key or anthropic_api_key == 'demo_key':
+        # Demo mode - show raw results without AI analysis
+        if json_only:
+            return {
                 'success': True,
-                'analysis': demo_analysis,
+                'analysis': None,
+                'sources': source_cards.to_json(results),
                 'result_count': len(results)
-            })
-
-        # AI analysis with valid API key
-        if analyzer is None or analyzer.client.api_key != anthropic_api_key:
-            analyzer = ChabadAnalyzer(anthropic_api_key)
+            }, 200
 
-        analysis = analyzer.analyze_search_results(search_term, results, context, conversation_history)
+        with span('render'):
+            demo_html = source_cards.render_demo(results, search_term)
+        return {
+            'success': True,
+            'analysis': demo_html,
+            'result_count': len(results)
+        }, 200
+
+    # AI analysis with valid API key
+    if analyzer is None or analyzer.client.api_key != anthropic_api_key:
+        similarity_fn = None
+        if semantic_engine and semantic_engine.provider.name == 'local':
+            similarity_fn = semantic_engine.sentence_similarity
+        analyzer = ChabadAnalyzer(
+            anthropic_api_key,
+            PassageSelector(search_service.passage_index, similarity_fn=similarity_fn),
+            int(os.environ.get('PASSAGE_TOKEN_BUDGET', 1500)),
+            int(os.environ.get('PROMPT_MAX_INPUT_TOKENS', 6000))
+        )
 
-        # Append ALL full sources after AI analysis
-        sources_html = f'<div dir="rtl"><h3 style="color: #C79A51; margin-top: 2rem; border-top: 2px solid #e5e7eb; padding-top: 1rem;">📖 כל המקורות ({len(results)} מקורות)</h3>'
+    search_terms = search_service.extract_search_terms(search_term)
+    analysis = analyzer.analyze_search_results(search_term, results, context, conversation_history, search_terms)
 
-        # Show ALL sources with full text (not just 10)
-        for i, result in enumerate(results, 1):
-            metadata = result.metadata
-            source_type = metadata.get('type', '')  # שיחה or מאמר
-            seif = metadata.get('seif', metadata.get('perek', ''))
-            farbrengen = metadata.get('farbrengen', '')
-            sicha = metadata.get('sicha', '')
-            maamar_type = metadata.get('maamar_type', '')
-
-            # Build source title based on type
-            if source_type == 'שיחה' and sicha:
-                source_title = f"{sicha}"
-            elif source_type == 'מאמר':
-                # Extract דיבור המתחיל from chunk_title
-                chunk_title = result.chunk_title
-                if 'ד"ה' in chunk_title or 'דה' in chunk_title:
-                    import re
-                    match = re.search(r'(ד[״\"]ה[^/]+)', chunk_title)
-                    if match:
-                        source_title = match.group(1).strip()
-                    else:
-                        source_title = chunk_title.split('//')[-1].split('//')[0].strip()
-                else:
-                    source_title = chunk_title.split('//')[-1].strip()
-            else:
-                source_title = sicha or result.chunk_title
-
-            sources_html += f'''
-<details style="margin: 15px 0; padding: 15px; background: #fef9f3; border-radius: 8px; border-right: 3px solid #C79A51;">
-<summary style="cursor: pointer; font-weight: bold; color: #1f2937; padding: 10px; font-size: 1.05rem;">
-📜 מקור {i}: {source_title} • סעיף {seif}
-</summary>
-<div style="padding: 10px 0; margin-top: 10px;">
-<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>סוג:</strong> {source_type}{f' ({maamar_type})' if maamar_type else ''}</p>
-<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>ספר:</strong> {result.work}</p>
-<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>כותרת מלאה:</strong> {result.chunk_title}</p>
-{f'<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>פרבענגען:</strong> {farbrengen}</p>' if farbrengen else ''}
-<div style="line-height: 1.9; font-family: 'Times New Roman', serif; font-size: 1.05rem; white-space: pre-wrap; border-top: 1px solid #e5e7eb; padding-top: 15px; margin-top: 10px;">
-{result.text}
-</div>
-</div>
-</details>
-'''
-
-        sources_html += '</div>'
-        full_response = analysis + sources_html
-
-        return jsonify({
+    if json_only:
+        # Clients render the cards themselves - no HTML beyond Claude's analysis
+        return {
             'success': True,
-            'analysis': full_response,
+            'analysis': analysis,
+            'sources': source_cards.to_json(results),
             'result_count': len(results),
             'raw_results_count': len(results)
-        })
+        }, 200
+
+    # Append ALL full sources after AI analysis, from the cards built at index time
+    with span('render'):
+        full_response = analysis + source_cards.render_sources(results)
+
+    return {
+        'success': True,
+        'analysis': full_response,
+        'result_count': len(results),
+        'raw_results_count': len(results)
+    }, 200
+
+@app.route('/api/search', methods=['POST'])
+def api_search():
+    """Main search endpoint"""
+    try:
+        data = request.get_json()
+        search_term = data.get('search_term', '').strip()
+        context = data.get('context', '').strip()
+        max_results = int(data.get('max_results', 15))
+        response_format = data.get('response_format', 'html')
+
+        # History lives server-side; conversation_history is still accepted to seed a new session
+        session_id = data.get('session_id')
+        if session_store.exists(session_id):
+            conversation_history = session_store.history(session_id)
+        else:
+            # Unknown or expired ids get a fresh server-generated session
+            conversation_history = (data.get('conversation_history') or [])[-session_store.max_turns:]
+            session_id = session_store.create(conversation_history)
+            conversation_history = session_store.history(session_id)
+
+        # Get API key from environment variable or request
+        anthropic_api_key = os.environ.get('ANTHROPIC_API_KEY', data.get('anthropic_api_key', '')).strip()
+
+        if not search_term:
+            return jsonify({'error': 'Search term is required'}), 400
+
+        with span('init'):
+            _ensure_services()
+
+        def run():
+            return _run_search(search_term, context, max_results, conversation_history, anthropic_api_key,
+                               response_format)
+
+        profile_id = None
+        trigger = request_profiler.trigger(request.headers)
+        if trigger:
+            # Profiled requests do their own work rather than waiting on someone else's
+            (payload, status), profile_id = request_profiler.run(run, trigger, {
+                'query': search_term, 'context': context, 'max_results': max_results,
+                'history_turns': len(conversation_history), 'response_format': response_format,
+                'hybrid': semantic_engine is not None,
+            })
+        else:
+            # Identical concurrent searches share one retrieval and one Claude call
+            key = (normalize_key_text(search_term), normalize_key_text(context), max_results,
+                   fingerprint(conversation_history), fingerprint(anthropic_api_key), response_format)
+            (payload, status), shared = search_flight.do(key, run)
+            if shared:
+                logger.info(f"Coalesced with an in-flight search for: {search_term}")
+
+        if payload.get('success') and payload.get('analysis'):
+            # Only complete exchanges - JSON/demo responses without an analysis leave history as it was
+            session_store.append(session_id, 'user', search_term)
+            session_store.append(session_id, 'assistant', payload['analysis'])
+        response = jsonify(dict(payload, session_id=session_id))
+        if profile_id:
+            response.headers['X-Profile-Id'] = profile_id
+        return response, status
 
     except Exception as e:
+        record_error('api_search')
         logger.error(f"Search error: {e}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/related/<ref>')
+def api_related(ref):
+    """Precomputed neighbours of one chunk (sichos:42, or a bare id if unambiguous) - no search, no Claude"""
+    with span('init'):
+        _ensure_services()
+    if chunk_neighbours is None:
+        return jsonify({'error': 'No neighbour table for this corpus - run python chunk_neighbours.py'}), 503
+
+    try:
+        resolved = chunk_neighbours.resolve(ref)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if resolved is None:
+        return jsonify({'error': f'Chunk not found: {ref}'}), 404
+
+    kind = request.args.get('kind')
+    if kind and kind not in NEIGHBOUR_KINDS:
+        return jsonify({'error': f"Unknown kind: {kind} - use one of {', '.join(NEIGHBOUR_KINDS)}"}), 400
+    kinds = [kind] if kind else NEIGHBOUR_KINDS
+    limit = min(max(1, request.args.get('limit', 10, type=int)), max(1, chunk_neighbours.top_n))
+    payload = {'success': True, 'chunk': resolved}
+    for kind in kinds:
+        related = [replace(chunk, similarity_score=score)
+                   for chunk, score in chunk_neighbours.related(resolved, kind, limit)]
+        payload[kind] = search_service.source_cards.to_json(related)
+    return jsonify(payload)
+
+def _profile_access_denied():
+    supplied = request.headers.get('X-Profile-Token') or request.args.get('token')
+    if not request_profiler.authorized(supplied):
+        return jsonify({'error': 'Profiling is disabled or the token is wrong'}), 403
+    return None
+
+@app.route('/api/profiles')
+def list_profiles():
+    """Stored request profiles, newest first"""
+    denied = _profile_access_denied()
+    if denied:
+        return denied
+    return jsonify({'profiles': request_profiler.list()})
+
+@app.route('/api/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Download a .prof file (snakeviz, pstats), or ?format=text for a pstats report"""
+    denied = _profile_access_denied()
+    if denied:
+        return denied
+    if request.args.get('format') == 'text':
+        report = request_profiler.as_text(profile_id, request.args.get('sort', 'cumulative'),
+                                          max(1, request.args.get('limit', 60, type=int)))
+        if report is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return Response(report, mimetype='text/plain; charset=utf-8')
+
+    path = request_profiler.path(profile_id)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path.resolve(), mimetype='application/octet-stream', as_attachment=True,
+                     download_name=path.name)
+
 @app.route('/api/health')
 def health_check():
     """Health check endpoint"""
@@ -809,6 +834,9 @@ def health_check():
         'sichos_accessible': sichos_exists,
         'maamarim_accessible': maamarim_exists,
         'dataset_accessible': sichos_exists and maamarim_exists,
+        'sessions': session_store.stats(),
+        'search_cache': search_service.search_cache.stats()
+                        if search_service is not None and search_service.search_cache is not None else None,
         'environment': 'production' if os.environ.get('RAILWAY_ENVIRONMENT') else 'development'
     })
 
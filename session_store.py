@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Server-side conversation sessions
+Bounded in-memory history per chavrusa session, so clients only send a session id
+"""
+
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from prompt_builder import SPACES_RE, TAG_RE, message_text, truncate_to_tokens
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class _Session:
+    __slots__ = ('turns', 'last_seen')
+
+    def __init__(self):
+        self.turns: List[Dict[str, str]] = []
+        self.last_seen = time.time()
+
+
+class SessionStore:
+    """LRU of sessions with a TTL - each session keeps its last max_turns turns as plain text"""
+
+    def __init__(self, max_sessions: int = 1000, max_turns: int = 6, max_turn_tokens: int = 600,
+                 ttl_seconds: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_turn_tokens = max_turn_tokens
+        self.ttl_seconds = ttl_seconds
+        self._sessions: 'OrderedDict[str, _Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = 0
+
+    @staticmethod
+    def valid_id(session_id: Optional[str]) -> bool:
+        return isinstance(session_id, str) and bool(SESSION_ID_RE.match(session_id))
+
+    def exists(self, session_id: Optional[str]) -> bool:
+        """Whether session_id was issued by this store and has not expired - clients can't pick ids"""
+        if not self.valid_id(session_id):
+            return False
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session is not None and time.time() - session.last_seen <= self.ttl_seconds
+
+    def create(self, history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """New server-generated session id, optionally seeded with client-supplied history"""
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sessions[session_id] = _Session()
+            self._evict()
+        for message in (history or [])[-self.max_turns:]:
+            if isinstance(message, dict):
+                self.append(session_id, message.get('role', ''), message_text(message))
+        return session_id
+
+    def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Stored turns for the session, oldest first - empty if unknown or expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            if time.time() - session.last_seen > self.ttl_seconds:
+                del self._sessions[session_id]
+                self._evicted += 1
+                return []
+            session.last_seen = time.time()
+            self._sessions.move_to_end(session_id)
+            return [dict(turn) for turn in session.turns]
+
+    def append(self, session_id: str, role: str, content: str):
+        """Add a turn as truncated plain text - ignored for unknown or evicted sessions"""
+        if role not in ('user', 'assistant'):
+            return
+        # Answers arrive as HTML - keep only their text, capped like the prompt would cap it
+        text = truncate_to_tokens(SPACES_RE.sub(' ', TAG_RE.sub(' ', content)).strip(), self.max_turn_tokens)
+        if not text:
+            return
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            session.turns.append({'role': role, 'content': text})
+            del session.turns[:-self.max_turns]
+            session.last_seen = time.time()
+            self._sessions.move_to_end(session_id)
+            self._evict()
+
+    def _evict(self):
+        """Drop expired sessions from the cold end, then the least recent beyond capacity"""
+        now = time.time()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_seen <= self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._evicted += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'turns': sum(len(s.turns) for s in self._sessions.values()),
+                'evicted': self._evicted,
+            }
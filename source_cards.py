@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Source cards for search results
+Title, metadata and HTML fragments are built once per chunk and reused on every hit
+"""
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from chunk_neighbours import chunk_ref
+
+if TYPE_CHECKING:
+    from server import SearchResult
+
+# דיבור המתחיל of a maamar, e.g. ד"ה וקבל היהודים
+DIBUR_HAMASCHIL_RE = re.compile(r'(ד[״"]ה[^/]+)')
+
+DEMO_TEXT_CHARS = 800
+
+# "More like this" for /api/related - hidden unless the page (index.html) shows and handles it
+RELATED_HTML = ('<button class="related-button" data-ref="{ref}" style="display: none;">🔗 עוד כמו זה</button>'
+                '<div class="related-list"></div>')
+
+
+def source_title(chunk_title: str, metadata: Dict[str, Any]) -> str:
+    """Display title - the sicha name, or the ד"ה of a maamar"""
+    source_type = metadata.get('type', '')
+    sicha = metadata.get('sicha', '')
+
+    if source_type == 'שיחה' and sicha:
+        return sicha
+    if source_type == 'מאמר':
+        if 'ד"ה' in chunk_title or 'דה' in chunk_title:
+            match = DIBUR_HAMASCHIL_RE.search(chunk_title)
+            if match:
+                return match.group(1).strip()
+        return chunk_title.split('//')[-1].strip()
+    return sicha or chunk_title
+
+
+@dataclass(frozen=True)
+class SourceCard:
+    """Everything the UI shows about one chunk, independent of where it ranked"""
+    file_path: str
+    chunk_id: Any
+    title: str
+    source_type: str
+    seif: str
+    work: str
+    author: str
+    chunk_title: str
+    farbrengen: str
+    maamar_type: str
+    text: str
+    # Fragments split around the result number, which is only known per request
+    full_html: Tuple[str, str]
+    demo_html: str
+
+    def render(self, index: int) -> str:
+        return f'{self.full_html[0]}{index}{self.full_html[1]}'
+
+    def to_dict(self, index: int, score: float = 0.0) -> Dict[str, Any]:
+        return {
+            'index': index,
+            'ref': chunk_ref(self.file_path, self.chunk_id),  # for /api/related
+            'file_path': self.file_path,
+            'chunk_id': self.chunk_id,
+            'title': self.title,
+            'type': self.source_type,
+            'seif': self.seif,
+            'work': self.work,
+            'author': self.author,
+            'chunk_title': self.chunk_title,
+            'farbrengen': self.farbrengen,
+            'maamar_type': self.maamar_type,
+            'score': score,
+            'text': self.text,
+        }
+
+
+def build_card(result: 'SearchResult') -> SourceCard:
+    metadata = result.metadata
+    source_type = metadata.get('type', '')  # שיחה or מאמר
+    seif = metadata.get('seif', metadata.get('perek', ''))
+    farbrengen = metadata.get('farbrengen', '')
+    maamar_type = metadata.get('maamar_type', '')
+    title = source_title(result.chunk_title, metadata)
+    related = RELATED_HTML.format(ref=chunk_ref(result.file_path, result.chunk_id))
+
+    head = f'''
+<details style="margin: 15px 0; padding: 15px; background: #fef9f3; border-radius: 8px; border-right: 3px solid #C79A51;">
+<summary style="cursor: pointer; font-weight: bold; color: #1f2937; padding: 10px; font-size: 1.05rem;">
+📜 מקור '''
+    tail = f''': {title} • סעיף {seif}
+</summary>
+<div style="padding: 10px 0; margin-top: 10px;">
+<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>סוג:</strong> {source_type}{f' ({maamar_type})' if maamar_type else ''}</p>
+<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>ספר:</strong> {result.work}</p>
+<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>כותרת מלאה:</strong> {result.chunk_title}</p>
+{f'<p style="font-size: 0.9rem; color: #666; margin: 5px 0;"><strong>פרבענגען:</strong> {farbrengen}</p>' if farbrengen else ''}
+<div style="line-height: 1.9; font-family: 'Times New Roman', serif; font-size: 1.05rem; white-space: pre-wrap; border-top: 1px solid #e5e7eb; padding-top: 15px; margin-top: 10px;">
+{result.text}
+</div>
+{related}
+</div>
+</details>
+'''
+
+    demo = f'''
+            <div style="margin: 20px 0; padding: 20px; border-right: 4px solid #C79A51; background: #f9f9f9; border-radius: 8px;">
+                <h4 style="color: #C79A51; margin-bottom: 10px;">{source_type} - סעיף {seif}</h4>
+                <p style="margin: 5px 0;"><strong>מקור:</strong> {result.author} - {result.work}</p>
+                <p style="margin: 5px 0;"><strong>כותרת:</strong> {result.chunk_title}</p>
+                <hr style="margin: 15px 0; border: none; border-top: 1px solid #ddd;">
+                <p style="margin-top: 15px; line-height: 1.8; font-family: 'Times New Roman', serif;">{result.text[:DEMO_TEXT_CHARS]}{'...' if len(result.text) > DEMO_TEXT_CHARS else ''}</p>
+                {related}
+            </div>
+            '''
+
+    return SourceCard(result.file_path, result.chunk_id, title, source_type, seif, result.work,
+                      result.author, result.chunk_title, farbrengen, maamar_type, result.text,
+                      (head, tail), demo)
+
+
+class SourceCards:
+    """Card per (file_path, chunk_id), filled at index time and on first sight of anything else"""
+
+    def __init__(self):
+        self._cards: Dict[Tuple[str, Any], SourceCard] = {}
+        self._lock = threading.Lock()
+
+    def add(self, result: 'SearchResult') -> SourceCard:
+        card = build_card(result)
+        with self._lock:
+            self._cards[(result.file_path, result.chunk_id)] = card
+        return card
+
+    def get(self, result: 'SearchResult') -> SourceCard:
+        card = self._cards.get((result.file_path, result.chunk_id))
+        return card if card is not None else self.add(result)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def render_sources(self, results: List['SearchResult']) -> str:
+        """Collapsible full-text card for every result, numbered from 1"""
+        header = (f'<div dir="rtl"><h3 style="color: #C79A51; margin-top: 2rem; border-top: 2px solid #e5e7eb; '
+                  f'padding-top: 1rem;">📖 כל המקורות ({len(results)} מקורות)</h3>')
+        cards = ''.join(self.get(result).render(i) for i, result in enumerate(results, 1))
+        return f'{header}{cards}</div>'
+
+    def render_demo(self, results: List['SearchResult'], search_term: str, limit: int = 5) -> str:
+        """Raw results shown when there is no API key for analysis"""
+        parts = [f'<div dir="rtl" style="padding: 20px;"><h3>נמצאו {len(results)} תוצאות עבור "{search_term}"</h3>',
+                 '<p style="color: #666; margin: 15px 0;"><em>מציג תוצאות ללא ניתוח AI (נדרש מפתח API)</em></p>']
+        parts.extend(self.get(result).demo_html for result in results[:limit])
+        if len(results) > limit:
+            parts.append(f'<p style="color: #888; text-align: center; margin-top: 20px;"><em>ועוד {len(results) - limit} '
+                         f'תוצאות נוספות...</em></p>')
+        parts.append('</div>')
+        return ''.join(parts)
+
+    def to_json(self, results: List['SearchResult']) -> List[Dict[str, Any]]:
+        """Sources as data for clients that render their own cards"""
+        return [self.get(result).to_dict(i, result.similarity_score) for i, result in enumerate(results, 1)]
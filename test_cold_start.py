@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""Import-time budget check for server.py (cold start of a keyword-only worker)"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Seconds a fresh interpreter may spend importing server.py
+IMPORT_BUDGET = float(os.environ.get('IMPORT_BUDGET_SECONDS', 1.0))
+
+# Modules that must only load once their provider is configured
+HEAVY_MODULES = ['anthropic', 'openai', 'numpy', 'sentence_transformers', 'torch']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_import():
+    """Import server.py in a clean interpreter and report time + heavy modules"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, EMBEDDING_PROVIDER='none')
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=here, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_server_import_budget():
+    result = measure_import()
+    assert not result['loaded'], f"Heavy modules loaded at import: {result['loaded']}"
+    assert result['elapsed'] < IMPORT_BUDGET, f"server.py import took {result['elapsed']:.2f}s (budget {IMPORT_BUDGET}s)"
+
+
+if __name__ == "__main__":
+    result = measure_import()
+    print(f"⏱️  server.py import: {result['elapsed']*1000:.0f} ms (budget {IMPORT_BUDGET*1000:.0f} ms)")
+    print(f"📦 Heavy modules loaded: {result['loaded'] or 'none'}")
+    ok = not result['loaded'] and result['elapsed'] < IMPORT_BUDGET
+    print("✅ Within budget" if ok else "❌ Over budget")
+    sys.exit(0 if ok else 1)
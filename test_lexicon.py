@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Lexicon groups and transliteration matching (lexicon.json)"""
+
+from lexicon import Lexicon, get_lexicon
+
+
+def assert_symmetric(lexicon, forms):
+    groups = {form: set(lexicon.entry(form).forms) for form in forms}
+    assert all(group == groups[forms[0]] for group in groups.values()), groups
+
+
+def test_merged_groups_are_symmetric():
+    lexicon = Lexicon()
+    lexicon.add(['שבת', 'שבת קודש'])
+    lexicon.add(['ש"ק', 'שבת קודש'])
+    lexicon.add(['תומ"צ', 'תורה ומצוות'])
+    lexicon.add(['תורה', 'תורה ומצוות'])
+    lexicon.add(['מצוות', 'תורה'])
+    assert_symmetric(lexicon, ['שבת', 'שבת קודש', 'ש"ק'])
+    assert_symmetric(lexicon, ['תומ"צ', 'תורה ומצוות', 'תורה', 'מצוות'])
+    assert 'שבת' not in lexicon.entry('תורה').forms
+
+
+def test_bundled_groups_are_symmetric():
+    lexicon = get_lexicon()
+    assert_symmetric(lexicon, ['ש"ק', 'שבת קודש', 'שבת'])
+    for members in lexicon._members.values():
+        assert_symmetric(lexicon, members)
+
+
+def test_misspelled_transliterations_resolve():
+    lexicon = get_lexicon()
+    for word, form in [('malchuss', 'מלכות'), ('chasidis', 'חסידות'), ('teshuvha', 'תשובה'), ('geulla', 'גאולה')]:
+        assert lexicon.correct(word) == form, word
+        assert [seg.text for seg in lexicon.segment([word])] == [form], word
+
+
+def test_english_words_pass_through():
+    lexicon = get_lexicon()
+    for word in ['tall', 'walk', 'torch', 'thank', 'unit', 'crust', 'ritual', 'prayers', 'teaching', 'people']:
+        assert lexicon.correct(word) is None, word
+        segment, = lexicon.segment([word])
+        assert segment.text == word and segment.entry is None, word
+    # A gloss still matches when typed as-is
+    assert [seg.text for seg in lexicon.segment(['talk'])] == ['שיחה']
+
+
+if __name__ == "__main__":
+    test_merged_groups_are_symmetric()
+    test_bundled_groups_are_symmetric()
+    test_misspelled_transliterations_resolve()
+    test_english_words_pass_through()
+    print("✅ Lexicon tests passed")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+In-memory inverted index over Chabad texts
+Token postings narrow the candidates; a substring check on the cleaned text confirms each hit
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+FOOTNOTE_RE = re.compile(r'<footnote>\d+</footnote>')
+PAGE_MARKER_RE = re.compile(r'<<<PAGE [^>]*>>>')
+TAG_RE = re.compile(r'<[^>]+>')
+SPACES_RE = re.compile(r'\s+')
+# Words, keeping Hebrew abbreviations like ר"ח or אדמו"ר as one token
+TOKEN_RE = re.compile(r'\w+(?:["״\'׳]\w+)*')
+
+
+def clean_text(text: str) -> str:
+    """Text as it is searched and shown - no markup, single spaces"""
+    text = FOOTNOTE_RE.sub('', text)
+    text = PAGE_MARKER_RE.sub('', text)
+    text = TAG_RE.sub('', text)
+    return SPACES_RE.sub(' ', text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+@dataclass(frozen=True)
+class IndexedDocument:
+    """One searchable unit - a book chunk or a block of a text file"""
+    doc_id: int
+    path: str
+    book: str
+    chunk_id: Any
+    title: str
+    text: str
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """A confirmed match with a snippet around its first occurrence"""
+    book: str
+    path: str
+    chunk_id: Any
+    title: str
+    snippet: str
+    position: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'book': self.book,
+            'path': self.path,
+            'chunk_id': self.chunk_id,
+            'title': self.title,
+            'snippet': self.snippet,
+            'position': self.position,
+        }
+
+
+class InvertedIndex:
+    """Token -> sorted doc ids, with substring lookups over the vocabulary"""
+
+    def __init__(self, fragment_cache_size: int = 2048):
+        self.documents: List[IndexedDocument] = []
+        self.postings: Dict[str, List[int]] = {}
+        self._search_texts: List[str] = []  # lowercased copy of each document's text
+        self._fragment_cache: 'OrderedDict[str, Set[int]]' = OrderedDict()
+        self._fragment_cache_size = fragment_cache_size
+        self._lock = threading.Lock()
+
+    def add(self, path: str, book: str, chunk_id: Any, title: str, text: str) -> IndexedDocument:
+        text = clean_text(text)
+        doc = IndexedDocument(len(self.documents), path, book, chunk_id, title, text)
+        self.documents.append(doc)
+        self._search_texts.append(text.lower())
+        for token in set(tokenize(text)):
+            self.postings.setdefault(token, []).append(doc.doc_id)
+        with self._lock:
+            self._fragment_cache.clear()
+        return doc
+
+    def __len__(self):
+        return len(self.documents)
+
+    def doc_freq(self, token: str) -> int:
+        return len(self.postings.get(token.lower(), ()))
+
+    def fragment_postings(self, fragment: str) -> Set[int]:
+        """Docs containing any token that contains fragment - substring semantics, cached"""
+        fragment = fragment.lower()
+        with self._lock:
+            cached = self._fragment_cache.get(fragment)
+            if cached is not None:
+                self._fragment_cache.move_to_end(fragment)
+                return cached
+
+        doc_ids: Set[int] = set()
+        for token, postings in self.postings.items():
+            if fragment in token:
+                doc_ids.update(postings)
+
+        with self._lock:
+            self._fragment_cache[fragment] = doc_ids
+            if len(self._fragment_cache) > self._fragment_cache_size:
+                self._fragment_cache.popitem(last=False)
+        return doc_ids
+
+    def candidates(self, phrase: str) -> Optional[Set[int]]:
+        """Docs that may contain phrase, or None when the phrase has no word to look up"""
+        words = tokenize(phrase)
+        if not words:
+            return None
+        # Rarest word first so the intersection shrinks quickly
+        word_sets = sorted((self.fragment_postings(w) for w in words), key=len)
+        result = set(word_sets[0])
+        for doc_ids in word_sets[1:]:
+            result &= doc_ids
+            if not result:
+                break
+        return result
+
+    def contains(self, doc_id: int, phrase: str) -> bool:
+        return phrase.lower() in self._search_texts[doc_id]
+
+    def search(self, query: str, limit: int = 20, context_chars: int = 200,
+               doc_ids: Optional[Iterable[int]] = None) -> List[SearchHit]:
+        """Documents containing query, in index order, stopping after limit hits"""
+        needle = clean_text(query).lower()
+        if not needle:
+            return []
+
+        if doc_ids is None:
+            candidates = self.candidates(needle)
+            doc_ids = sorted(candidates) if candidates is not None else range(len(self.documents))
+
+        hits = []
+        for doc_id in doc_ids:
+            position = self._search_texts[doc_id].find(needle)
+            if position < 0:
+                continue
+            hits.append(self._hit(self.documents[doc_id], position, len(needle), context_chars))
+            if len(hits) >= limit:
+                break  # early termination - no need to scan the rest
+        return hits
+
+    def _hit(self, doc: IndexedDocument, position: int, length: int, context_chars: int) -> SearchHit:
+        start = max(0, position - context_chars)
+        end = min(len(doc.text), position + length + context_chars)
+        snippet = doc.text[start:end]
+        if start > 0:
+            snippet = '...' + snippet
+        if end < len(doc.text):
+            snippet += '...'
+        return SearchHit(doc.book, doc.path, doc.chunk_id, doc.title, snippet, position)
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Batch translation jobs for whole sefarim
+Bounded worker pool, rate-limit-aware retries and on-disk progress so jobs resume after a restart
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+class TranslationError(Exception):
+    """A translation call failed and should not be retried"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RetryableTranslationError(TranslationError):
+    """A transient failure (rate limit, overload, timeout) worth retrying"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message, status_code)
+        self.retry_after = retry_after
+
+
+@dataclass
+class TranslationJob:
+    """Status of one batch translation job - persisted as job.json"""
+    job_id: str
+    path: str
+    start: int
+    end: int
+    target_language: str
+    status: str = 'queued'  # queued, running, completed, failed, cancelled
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    error: str = ''
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class TranslationJobManager:
+    """Runs translation jobs on a shared, bounded pool of workers
+
+    Progress lives under jobs_dir/<job_id>/: job.json for status and an
+    append-only results.jsonl with one line per finished chunk. Run a single
+    process per jobs_dir - every process resumes the unfinished jobs it finds.
+    """
+
+    def __init__(self, translate_fn: Callable[[str, str], str],
+                 fetch_chunk_fn: Callable[[str, int], Optional[Dict[str, Any]]],
+                 count_chunks_fn: Callable[[str], int],
+                 jobs_dir: str = 'translation_jobs', workers: int = 4,
+                 max_retries: int = 5, base_delay: float = 2.0, max_delay: float = 60.0):
+        self.translate_fn = translate_fn
+        self.fetch_chunk_fn = fetch_chunk_fn
+        self.count_chunks_fn = count_chunks_fn
+        self.jobs_dir = jobs_dir
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.jobs: Dict[str, TranslationJob] = {}
+        self._done: Dict[str, set] = {}
+        self._cancelled: set = set()
+        self._lock = threading.Lock()
+        # When the API says slow down, every worker waits until this moment
+        self._cooldown_until = 0.0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='translation-job')
+
+        os.makedirs(self.jobs_dir, exist_ok=True)
+
+    def submit(self, path: str, start: int = 0, end: Optional[int] = None,
+               target_language: str = 'English') -> TranslationJob:
+        """Queue chunks [start, end) of a sefer for translation"""
+        total_chunks = self.count_chunks_fn(path)
+        if total_chunks == 0:
+            raise ValueError(f"No chunks found for {path}")
+        end = total_chunks if end is None else min(end, total_chunks)
+        if start < 0 or start >= end:
+            raise ValueError(f"Invalid chunk range {start}-{end} (sefer has {total_chunks} chunks)")
+
+        job = TranslationJob(job_id=uuid.uuid4().hex[:12], path=path, start=start, end=end,
+                             target_language=target_language, total=end - start)
+        with self._lock:
+            self.jobs[job.job_id] = job
+            self._done[job.job_id] = set()
+        os.makedirs(self._job_dir(job.job_id), exist_ok=True)
+        self._save(job)
+        self._schedule(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[TranslationJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[TranslationJob]:
+        return sorted(self.jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def cancel(self, job_id: str) -> Optional[TranslationJob]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        with self._lock:
+            self._cancelled.add(job_id)
+            if job.status in ('queued', 'running'):
+                job.status = 'cancelled'
+                job.updated_at = time.time()
+        self._save(job)
+        return job
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Finished chunks of a job ordered by chunk index - available while the job runs"""
+        path = os.path.join(self._job_dir(job_id), 'results.jsonl')
+        if not os.path.exists(path):
+            return []
+        # A chunk that failed and was retried has several lines - a success wins
+        by_index: Dict[int, Dict[str, Any]] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if 'translation' in row or 'translation' not in by_index.get(row['index'], {}):
+                    by_index[row['index']] = row
+        return [by_index[i] for i in sorted(by_index)][offset:offset + limit]
+
+    def resume(self) -> int:
+        """Reload persisted jobs and re-queue the chunks that never finished"""
+        resumed = 0
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job_file = os.path.join(self._job_dir(job_id), 'job.json')
+            if not os.path.isfile(job_file):
+                continue
+            with open(job_file, 'r', encoding='utf-8') as f:
+                job = TranslationJob(**json.load(f))
+
+            done = {row['index'] for row in self.results(job_id, 0, job.total) if 'translation' in row}
+            with self._lock:
+                self.jobs[job_id] = job
+                self._done[job_id] = done
+                job.completed = len(done)
+
+            if job.status in ('queued', 'running'):
+                job.failed = 0  # failed chunks get another chance after a restart
+                self._schedule(job)
+                resumed += 1
+        return resumed
+
+    def _schedule(self, job: TranslationJob):
+        pending = [i for i in range(job.start, job.end) if i not in self._done[job.job_id]]
+        if not pending:
+            self._finish_if_done(job)
+            return
+        for index in pending:
+            self._pool.submit(self._run_chunk, job, index)
+
+    def _run_chunk(self, job: TranslationJob, index: int):
+        if job.job_id in self._cancelled:
+            return
+
+        with self._lock:
+            if job.status == 'queued':
+                job.status = 'running'
+
+        row: Dict[str, Any] = {'index': index}
+        try:
+            chunk = self.fetch_chunk_fn(job.path, index)
+            if chunk is None:
+                raise TranslationError(f"Chunk {index} not found")
+            row['title'] = chunk.get('title', '')
+            row['original'] = chunk['content']
+            row['translation'] = self._translate_with_retries(chunk['content'], job)
+        except Exception as e:
+            row['error'] = str(e)
+
+        if job.job_id in self._cancelled:
+            return
+
+        with self._lock:
+            with open(os.path.join(self._job_dir(job.job_id), 'results.jsonl'), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            if 'translation' in row:
+                self._done[job.job_id].add(index)
+                job.completed += 1
+            else:
+                job.failed += 1
+                job.error = row['error']
+            job.updated_at = time.time()
+
+        self._finish_if_done(job)
+
+    def _translate_with_retries(self, text: str, job: TranslationJob) -> str:
+        attempt = 0
+        while True:
+            self._wait_for_cooldown()
+            if job.job_id in self._cancelled:
+                raise TranslationError('Job cancelled')
+            try:
+                return self.translate_fn(text, job.target_language)
+            except RetryableTranslationError as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                # Exponential backoff with full jitter; honour Retry-After when given
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                if e.retry_after:
+                    delay = max(delay, e.retry_after)
+                if e.status_code in (429, 529):
+                    with self._lock:
+                        self._cooldown_until = max(self._cooldown_until, time.time() + delay)
+                else:
+                    time.sleep(delay)
+
+    def _wait_for_cooldown(self):
+        while True:
+            remaining = self._cooldown_until - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def _finish_if_done(self, job: TranslationJob):
+        with self._lock:
+            if job.status not in ('queued', 'running') or job.completed + job.failed < job.total:
+                return
+            job.status = 'completed' if job.failed == 0 else 'failed'
+            job.updated_at = time.time()
+        self._save(job)
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _save(self, job: TranslationJob):
+        path = os.path.join(self._job_dir(job.job_id), 'job.json')
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            payload = job.to_dict()
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
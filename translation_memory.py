@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Persistent translation memory
+Caches translations by normalized-text hash, target language and prompt version
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+FOOTNOTE_RE = re.compile(r'<footnote>\d+</footnote>')
+TAG_RE = re.compile(r'<[^>]+>')
+SPACES_RE = re.compile(r'\s+')
+# Nikud/teamim, punctuation, digits and whitespace - ignored for near-duplicate matching
+LOOSE_STRIP_RE = re.compile(r'[֑-ׇ\W\d_]+')
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form for exact matching - markup and spacing differences don't count"""
+    text = unicodedata.normalize('NFC', text)
+    text = FOOTNOTE_RE.sub('', text)
+    text = TAG_RE.sub('', text)
+    return SPACES_RE.sub(' ', text).strip()
+
+
+def loose_text(text: str) -> str:
+    """Letters only - two texts differing just in nikud, punctuation or numbering collide"""
+    return LOOSE_STRIP_RE.sub('', normalize_text(text)).lower()
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """SQLite-backed store of finished translations with hit-rate counters"""
+
+    def __init__(self, db_path: str = 'translation_memory.sqlite3', near_duplicates: bool = False):
+        self.db_path = db_path
+        self.near_duplicates = near_duplicates
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'stores': 0}
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                loose_key TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_loose ON translations (loose_key)')
+        self._conn.commit()
+
+    def get(self, text: str, target_language: str, prompt_version: str) -> Optional[str]:
+        """Cached translation for this text, or None"""
+        key = _digest(normalize_text(text), target_language, prompt_version)
+        with self._lock:
+            row = self._conn.execute('SELECT translation FROM translations WHERE key = ?', (key,)).fetchone()
+            if row is None and self.near_duplicates:
+                loose_key = _digest(loose_text(text), target_language, prompt_version)
+                row = self._conn.execute(
+                    'SELECT translation, key FROM translations WHERE loose_key = ? ORDER BY hits DESC LIMIT 1',
+                    (loose_key,)).fetchone()
+                if row is not None:
+                    key = row[1]
+                    self._stats['near_hits'] += 1
+            elif row is not None:
+                self._stats['hits'] += 1
+
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            self._conn.execute('UPDATE translations SET hits = hits + 1 WHERE key = ?', (key,))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, text: str, target_language: str, prompt_version: str, translation: str):
+        """Remember a successful translation"""
+        key = _digest(normalize_text(text), target_language, prompt_version)
+        loose_key = _digest(loose_text(text), target_language, prompt_version)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO translations '
+                '(key, loose_key, target_language, prompt_version, translation, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, loose_key, target_language, prompt_version, translation, time.time()))
+            self._conn.commit()
+            self._stats['stores'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters since startup plus the size of the memory"""
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['entries'] = entries
+        stats['hit_rate'] = round((stats['hits'] + stats['near_hits']) / lookups, 4) if lookups else 0.0
+        stats['near_duplicates'] = self.near_duplicates
+        return stats
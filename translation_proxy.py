@@ -5,11 +5,18 @@ Enhanced proxy server with translation feature for Chabad sefarim
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import json
 import os
-import subprocess
-import glob
+import hashlib
+from llm_gateway import LLMGatewayError, get_gateway
+from passage_selector import estimate_tokens
+from prompt_builder import PromptBuilder
+from sefer_chunker import SeferChunker, split_spans
+from translation_jobs import TranslationJobManager, TranslationError, RetryableTranslationError
+from translation_memory import TranslationMemory, normalize_text
+from single_flight import SingleFlight
+from sefarim_catalog import SefarimCatalog
+from corpus_index import get_corpus_index, format_hits
 
 app = Flask(__name__)
 CORS(app)
@@ -19,61 +26,36 @@ CHABAD_DATA_PATH = os.getenv('CHABAD_DATA_PATH',
     '/Users/elishapearl/Library/CloudStorage/Dropbox/chabad-uploads' if os.path.exists('/Users/elishapearl/Library/CloudStorage/Dropbox/chabad-uploads')
     else './data')
 CLAUDE_API_KEY = os.getenv('CLAUDE_API_KEY')
+SEARCH_HIT_LIMIT = int(os.getenv('SEARCH_HIT_LIMIT', 20))
 
 if not CLAUDE_API_KEY:
     raise ValueError("CLAUDE_API_KEY environment variable is required")
 
-def list_sefarim():
-    """List all available sefarim in the Dropbox folder"""
-    try:
-        sefarim = []
-        if os.path.exists(CHABAD_DATA_PATH):
-            # Find all text and JSON files
-            for pattern in ['*.txt', '*.json']:
-                files = glob.glob(os.path.join(CHABAD_DATA_PATH, '**', pattern), recursive=True)
-                for filepath in files:
-                    rel_path = os.path.relpath(filepath, CHABAD_DATA_PATH)
-                    filename = os.path.basename(filepath)
-                    sefarim.append({
-                        'name': filename,
-                        'path': rel_path,
-                        'size': os.path.getsize(filepath)
-                    })
-        return sefarim
-    except Exception as e:
-        return []
+sefarim_catalog = SefarimCatalog(
+    CHABAD_DATA_PATH,
+    refresh_interval=float(os.getenv('SEFARIM_CATALOG_REFRESH_SECONDS', 30)),
+    cache_file=os.getenv('SEFARIM_CATALOG_CACHE', '.sefarim_catalog.json')
+)
 
-def get_file_chunks(filepath, chunk_size=2000):
-    """Break a sefer into translatable chunks"""
+def list_sefarim(offset=0, limit=None, q='', author='', ext=''):
+    """List available sefarim from the cached catalog - returns (page, total)"""
     try:
-        full_path = os.path.join(CHABAD_DATA_PATH, filepath)
-        if not os.path.exists(full_path):
-            return []
-
-        with open(full_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Split into chunks of ~2000 characters
-        chunks = []
-        for i in range(0, len(content), chunk_size):
-            chunk = content[i:i+chunk_size]
-            chunks.append({
-                'index': len(chunks),
-                'content': chunk,
-                'start_pos': i,
-                'end_pos': min(i+chunk_size, len(content))
-            })
-
-        return chunks
+        entries, total = sefarim_catalog.list(offset, limit, q, author, ext)
+        return [entry.to_dict() for entry in entries], total
     except Exception as e:
-        return []
+        return [], 0
 
-def translate_chunk(chunk_text, target_language='English'):
-    """Translate a chunk using Claude"""
+sefer_chunker = SeferChunker(CHABAD_DATA_PATH, chunk_size=int(os.getenv('SEFER_CHUNK_SIZE', 2000)))
+
+def get_file_chunks(filepath, offset=0, limit=10):
+    """Break a sefer into translatable chunks - one page at a time, on seif/sentence boundaries"""
     try:
-        prompt = f"""אתה מתרגם מומחה של ספרות חסידית חב"ד. תרגם את הקטע הבא ל{target_language}:
+        return sefer_chunker.page(filepath, offset, limit)
+    except Exception as e:
+        return {'chunks': [], 'total_chunks': 0, 'offset': offset, 'limit': limit, 'has_more': False}
 
-{chunk_text}
+# Static translation instructions - identical on every call, but below the 1024-token minimum Claude caches
+TRANSLATION_SYSTEM_PROMPT = """אתה מתרגם מומחה של ספרות חסידית חב"ד.
 
 **הנחיות לתרגום:**
 
@@ -91,47 +73,129 @@ def translate_chunk(chunk_text, target_language='English'):
 
 התמקד בהעברת הלימוד החסידי העמוק תוך שמירה על כבוד הטקסט המקודש."""
 
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': CLAUDE_API_KEY,
-                'anthropic-version': '2023-06-01'
-            },
-            json={
-                'model': 'claude-sonnet-4-20250514',
-                'max_tokens': 3000,
-                'messages': [{'role': 'user', 'content': prompt}]
-            },
-            timeout=60
-        )
+TRANSLATION_MODEL = 'claude-sonnet-4-20250514'
+
+# Any change to the model or instructions invalidates remembered translations
+TRANSLATION_PROMPT_VERSION = hashlib.sha256(
+    f"{TRANSLATION_MODEL}\n{TRANSLATION_SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:12]
+
+translation_memory = TranslationMemory(
+    os.getenv('TRANSLATION_MEMORY_DB', 'translation_memory.sqlite3'),
+    near_duplicates=os.getenv('TRANSLATION_MEMORY_NEAR_DUPLICATES', '').lower() in ('1', 'true', 'yes')
+)
+translation_flight = SingleFlight()
+
+translation_prompts = PromptBuilder(TRANSLATION_SYSTEM_PROMPT,
+                                    max_input_tokens=int(os.getenv('TRANSLATION_MAX_INPUT_TOKENS', 6000)))
+# Longer texts are translated in parts - the answer (max_tokens 3000) must fit the whole part too
+TRANSLATION_PART_TOKENS = int(os.getenv('TRANSLATION_PART_TOKENS', 1500))
+
+def translation_parts(chunk_text, instruction):
+    """chunk_text split on seif/sentence boundaries into parts that each fit one prompt"""
+    budget = min(translation_prompts.user_budget - estimate_tokens(instruction), TRANSLATION_PART_TOKENS)
+    size = max(len(chunk_text), 1)
+    while True:
+        parts = [chunk_text[start:end] for start, end in split_spans(chunk_text, size)]
+        if all(estimate_tokens(part) <= budget for part in parts):
+            return parts
+        if size <= 100:
+            raise TranslationError("Text cannot be split to fit the translation prompt budget", 413)
+        size //= 2
+
+def request_translation(chunk_text, target_language='English'):
+    """Translate a chunk using Claude, raising TranslationError on failure
+
+    Text over the budget is translated part by part and joined - never cut short.
+    """
+    instruction = f"תרגם את הקטע הבא ל{target_language}:\n\n"
+    parts = translation_parts(chunk_text, instruction)
+    if len(parts) > 1:
+        return '\n\n'.join(request_translation(part, target_language) for part in parts)
+    prompt = translation_prompts.build(instruction + chunk_text, truncate=False)
 
-        if response.status_code == 200:
-            result = response.json()
-            return result['content'][0]['text']
-        else:
-            return f"Translation error: {response.status_code}"
+    try:
+        # No gateway retries - the job manager retries with a shared cooldown instead
+        result = get_gateway().create_message({
+            'model': TRANSLATION_MODEL,
+            'max_tokens': 3000,
+            'system': prompt['system'],
+            'messages': prompt['messages']
+        }, api_key=CLAUDE_API_KEY, timeout=60, max_retries=0)
+    except LLMGatewayError as e:
+        # 429 rate limit, 529 overloaded, 5xx and network failures are transient
+        if e.retryable:
+            raise RetryableTranslationError(f"Translation error: {e.status_code or e}", e.status_code,
+                                            e.retry_after)
+        raise TranslationError(f"Translation error: {e.status_code}", e.status_code)
+
+    if result.get('stop_reason') == 'max_tokens':
+        # A partial translation must never reach the translation memory
+        raise TranslationError("Translation was cut off at max_tokens", 413)
+    return result['content'][0]['text']
+
+def cached_translation(chunk_text, target_language='English'):
+    """Serve from the translation memory, calling Claude only on a miss"""
+    translation = translation_memory.get(chunk_text, target_language, TRANSLATION_PROMPT_VERSION)
+    if translation is None:
+        # Concurrent misses for the same text wait on a single Claude call
+        key = (normalize_text(chunk_text), target_language)
+        translation, shared = translation_flight.do(key, lambda: request_translation(chunk_text, target_language))
+        if not shared:
+            translation_memory.put(chunk_text, target_language, TRANSLATION_PROMPT_VERSION, translation)
+    return translation
 
+def translate_chunk(chunk_text, target_language='English'):
+    """Translate a chunk using Claude"""
+    try:
+        return cached_translation(chunk_text, target_language)
+    except TranslationError as e:
+        return str(e)
     except Exception as e:
         return f"Translation failed: {str(e)}"
 
+def fetch_chunk(filepath, index):
+    """A single chunk of a sefer, for the job workers"""
+    chunks = sefer_chunker.page(filepath, index, 1)['chunks']
+    return chunks[0] if chunks else None
+
+translation_jobs = TranslationJobManager(
+    cached_translation,
+    fetch_chunk,
+    lambda filepath: sefer_chunker.page(filepath, 0, 0)['total_chunks'],
+    jobs_dir=os.getenv('TRANSLATION_JOBS_DIR', 'translation_jobs'),
+    workers=int(os.getenv('TRANSLATION_JOB_WORKERS', 4)),
+    max_retries=int(os.getenv('TRANSLATION_JOB_MAX_RETRIES', 5))
+)
+translation_jobs.resume()
+
 @app.route('/sefarim', methods=['GET'])
 def get_sefarim_list():
-    """Get list of all available sefarim"""
-    sefarim = list_sefarim()
+    """Get list of available sefarim (?offset=&limit=&q=&author=&ext=)"""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = request.args.get('limit', type=int)
+    sefarim, total = list_sefarim(
+        offset,
+        max(1, limit) if limit is not None else None,
+        request.args.get('q', '').strip(),
+        request.args.get('author', '').strip(),
+        request.args.get('ext', '').strip()
+    )
     return jsonify({
         'sefarim': sefarim,
-        'count': len(sefarim)
+        'count': total,
+        'offset': offset,
+        'limit': limit
     })
 
 @app.route('/sefer/<path:filepath>/chunks', methods=['GET'])
 def get_sefer_chunks(filepath):
-    """Get chunks of a specific sefer for translation"""
-    chunks = get_file_chunks(filepath)
+    """Get a page of chunks of a specific sefer for translation (?offset=0&limit=10)"""
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 10, type=int)), 100)
+    page = get_file_chunks(filepath, offset, limit)
     return jsonify({
         'filepath': filepath,
-        'chunks': chunks[:10],  # Return first 10 chunks
-        'total_chunks': len(chunks)
+        **page
     })
 
 @app.route('/translate', methods=['POST'])
@@ -156,37 +220,104 @@ def translate_chunk_endpoint():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/translate/jobs', methods=['POST'])
+def create_translation_job():
+    """Start translating a whole sefer (or a chunk range) in the background"""
+    try:
+        data = request.get_json(force=True) or {}
+        path = data.get('path', '').strip()
+        if not path:
+            return jsonify({'error': 'No sefer path provided'}), 400
+
+        job = translation_jobs.submit(
+            path,
+            int(data.get('start', 0)),
+            int(data['end']) if data.get('end') is not None else None,
+            data.get('target_language', 'English')
+        )
+        return jsonify(job.to_dict()), 202
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/translate/jobs', methods=['GET'])
+def list_translation_jobs():
+    """List all translation jobs, newest first"""
+    jobs = [job.to_dict() for job in translation_jobs.list_jobs()]
+    return jsonify({'jobs': jobs, 'count': len(jobs)})
+
+@app.route('/translate/jobs/<job_id>', methods=['GET'])
+def get_translation_job(job_id):
+    """Progress of a translation job"""
+    job = translation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/translate/jobs/<job_id>/results', methods=['GET'])
+def get_translation_job_results(job_id):
+    """Translated chunks so far (?offset=0&limit=50), ordered by chunk index"""
+    job = translation_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 50, type=int)), 500)
+    return jsonify({
+        'job': job.to_dict(),
+        'results': translation_jobs.results(job_id, offset, limit),
+        'offset': offset,
+        'limit': limit
+    })
+
+@app.route('/translate/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_translation_job(job_id):
+    """Stop a running translation job - finished chunks are kept"""
+    job = translation_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({
         'status': 'ok',
         'dataset_accessible': os.path.exists(CHABAD_DATA_PATH),
-        'features': ['search', 'translate', 'sefarim_list']
+        'features': ['search', 'translate', 'translate_jobs', 'sefarim_list'],
+        'translation_memory': translation_memory.stats(),
+        'translation_coalescing': translation_flight.stats()
     })
 
 # Keep existing search functionality
 def search_chabad_files(query):
     """Search through Chabad files for the query term"""
     search_results = []
+
     try:
-        cmd = [
-            '/Users/elishapearl/.nvm/versions/node/v22.14.0/lib/node_modules/@anthropic-ai/claude-code/vendor/ripgrep/arm64-darwin/rg',
-            '-n', '-C', '2',
-            '--type', 'json',
-            query,
-            CHABAD_DATA_PATH
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        if result.returncode == 0 and result.stdout:
+        # Shared in-process index - built on first use, no subprocess per query
+        corpus = get_corpus_index(CHABAD_DATA_PATH)
+        if corpus is None:
             search_results.append({
-                'source': 'ripgrep_json',
-                'content': result.stdout[:3000]
+                'source': 'error',
+                'content': f'Dataset not found: {CHABAD_DATA_PATH}'
             })
+            return search_results
+
+        hits = corpus.search(query, limit=SEARCH_HIT_LIMIT)
+        if hits:
+            search_results.append({
+                'source': 'corpus_index',
+                'content': format_hits(hits),  # Limit content size for faster processing
+                'hits': [hit.to_dict() for hit in hits]
+            })
+
     except Exception as e:
         search_results.append({
             'source': 'error',
             'content': f'Search error: {str(e)}'
         })
+
     return search_results
 
 @app.route('/search', methods=['POST', 'OPTIONS'])
@@ -234,32 +365,21 @@ def search_and_analyze():
 התמקד במשמעות הרוחנית העמוקה ובחיבור למערכת החסידית הכוללת."""
 
         # Send to Claude
-        response = requests.post(
-            'https://api.anthropic.com/v1/messages',
-            headers={
-                'Content-Type': 'application/json',
-                'x-api-key': CLAUDE_API_KEY,
-                'anthropic-version': '2023-06-01'
-            },
-            json={
-                'model': 'claude-sonnet-4-20250514',
-                'max_tokens': 4000,
-                'messages': [{'role': 'user', 'content': prompt}]
-            },
-            timeout=120
-        )
+        claude_result = get_gateway().create_message({
+            'model': 'claude-sonnet-4-20250514',
+            'max_tokens': 4000,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }, api_key=CLAUDE_API_KEY, timeout=120)
 
-        if response.status_code == 200:
-            claude_result = response.json()
-            return jsonify({
-                'query': query,
-                'search_results_count': len([r for r in search_results if r.get('source') != 'error']),
-                'analysis': claude_result,
-                'raw_search_results': search_results
-            })
-        else:
-            return jsonify({'error': f'Claude API error: {response.status_code}'}), response.status_code
+        return jsonify({
+            'query': query,
+            'search_results_count': len([r for r in search_results if r.get('source') != 'error']),
+            'analysis': claude_result,
+            'raw_search_results': search_results
+        })
 
+    except LLMGatewayError as e:
+        return jsonify({'error': str(e)}), e.status_code or 502
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 